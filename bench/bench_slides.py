@@ -0,0 +1,261 @@
+"""Benchmark generowania slajdów na syntetycznych raportach, bez dostępu do sieci.
+
+Grafiki kart są generowane do katalogu tymczasowego i serwowane przez lokalny serwer HTTP,
+więc mierzona jest także ścieżka pobierania i cache obrazów.
+
+Przykłady:
+    python bench/bench_slides.py                          # rozmiary 10, 100, 1000 tematów
+    python bench/bench_slides.py --sizes 10 --save-baseline
+    python bench/bench_slides.py --sizes 10 --max-slowdown 0.2
+
+Wynik jest porównywany z bench/baseline.json (jeśli istnieje); przekroczenie progów kończy
+program kodem 1.
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import main3 # noqa: E402
+
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+CARD_IMAGES = 24 # Liczba różnych grafik kart w zestawie testowym
+CATEGORIES = list(main3.PALETTES) + ['ciekawostki', 'rokowanie']
+WORDS = ['największe', 'wzrosty', 'cen', 'karty', 'Pokémon', 'tygodnia', 'inwestycje', 'alt', 'art',
+         'rosnące', 'nowych', 'setów', 'potencjał', 'kolekcjonerskie', 'rzadkie', 'promo']
+
+
+# --- DANE TESTOWE ---
+
+def make_fixture_images(directory, seed=0):
+    """Tworzy grafiki kart (734x1024, z szumem jak w skanach) i tło."""
+    rng = random.Random(seed)
+    for i in range(CARD_IMAGES):
+        color = Image.new('RGB', (734, 1024), tuple(rng.randrange(256) for _ in range(3)))
+        noise = Image.effect_noise((734, 1024), 40).convert('RGB')
+        Image.blend(color, noise, 0.3).save(os.path.join(directory, f"card_{i}.png"))
+    Image.new('RGB', (734, 1024), '#2A4B8D').save(os.path.join(directory, 'cardback.png'))
+
+
+def make_report(path, topics, base_url, seed=0):
+    """Zapisuje syntetyczny raport CSV w formacie pokemon_tcg_report_*.csv."""
+    import csv
+
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(main3.REPORT_COLUMNS)
+        for index in range(topics):
+            cards = rng.randint(3, 5)
+            names, images, prices = [], [], []
+            for number in range(1, cards + 1):
+                card = rng.randrange(CARD_IMAGES)
+                start = round(rng.uniform(5, 1500), 2)
+                end = round(start * rng.uniform(0.7, 2.5), 2)
+                pct = (end - start) / start * 100
+                names.append(f"{number}. {' '.join(rng.sample(WORDS, 2)).title()} (Evolving Skies {card}/203)")
+                images.append(f"{base_url}/card_{card}.png")
+                prices.append(f"{start / 3.6:.2f} USD → {end / 3.6:.2f} USD → {pct:+.1f}% (≈ {start:.2f} PLN → {end:.2f} PLN)")
+            writer.writerow([
+                f"Temat {index + 1}: {' '.join(rng.sample(WORDS, rng.randint(3, 8)))}",
+                CATEGORIES[index % len(CATEGORIES)],
+                ' '.join(rng.choice(WORDS) for _ in range(rng.randint(12, 30))),
+                '\n'.join(names),
+                '\n'.join(images),
+                '\n'.join(prices),
+                f"{base_url}/cardback.png",
+                "Benchmark",
+            ])
+
+
+def serve_directory(directory):
+    """Uruchamia lokalny serwer HTTP w wątku i zwraca (serwer, bazowy URL)."""
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# --- POMIARY ---
+
+def time_call(function, repeats):
+    """Zwraca średni, medianowy i najlepszy czas wywołania w milisekundach."""
+    function() # Rozgrzewka: pierwsze wywołanie wypełnia cache teł i czcionek
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'mean_ms': statistics.mean(times), 'median_ms': statistics.median(times), 'min_ms': min(times)}
+
+
+def run_micro(report_path, repeats):
+    """Mierzy poszczególne generatory slajdów w bieżącym procesie (cache obrazów rozgrzany)."""
+    errors = []
+    topics = list(main3.iter_topics(report_path, errors))[:5]
+    main3.prefetch_images(main3.collect_image_urls(topics))
+    main3.preload_assets()
+
+    topic = topics[0]
+    card = topic.cards[0]
+    palette = main3.PALETTES['default']
+    total = 2 + len(topic.cards) + 1
+    price = main3.parse_price(card.price)
+    return {
+        'generate_title_slide': time_call(lambda: main3.generate_title_slide(topic, palette, 1, total), repeats),
+        'generate_description_slide': time_call(lambda: main3.generate_description_slide(topic, palette, 2, total), repeats),
+        'generate_card_slide': time_call(lambda: main3.generate_card_slide(card.name, card.image_url, card.price, palette, 3, total), repeats),
+        'generate_final_slide': time_call(lambda: main3.generate_final_slide(topic, palette, total, total), repeats),
+        'create_price_chart': time_call(lambda: main3.create_price_chart(price.start, price.end, palette['chart']), repeats * 5),
+    }
+
+
+def run_end_to_end(report_path, workers):
+    """Uruchamia pełne generowanie w osobnym procesie (zimny cache) i mierzy czas oraz szczytowe RSS."""
+    work_dir = os.path.dirname(report_path)
+    command = [sys.executable, os.path.join(REPO_DIR, 'main3.py'), report_path, '--force', '--workers', str(workers)]
+    log_path = os.path.join(work_dir, 'main3.log')
+    with open(log_path, 'wb') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+    if status != 0:
+        with open(log_path, encoding='utf-8', errors='replace') as log:
+            raise RuntimeError(f"main3.py zakończył się błędem:\n{log.read()[-2000:]}")
+
+    output_dir = os.path.join(work_dir, main3.OUTPUT_DIR)
+    slides = sum(1 for _, _, files in os.walk(output_dir) for name in files if name.endswith(main3.OUTPUT_OPTIONS.extension))
+    return {
+        'seconds': elapsed,
+        'slides': slides,
+        'slides_per_s': slides / elapsed,
+        'peak_rss_mb': usage.ru_maxrss / 1024, # ru_maxrss jest w KiB (Linux)
+    }
+
+
+# --- PORÓWNANIE Z WZORCEM ---
+
+def flatten(results):
+    """Zamienia wyniki na płaski słownik metryk {nazwa: wartość}."""
+    metrics = {}
+    for name, values in results['micro'].items():
+        metrics[f"{name}.median_ms"] = values['median_ms'] # Mediana jest odporniejsza na szum niż średnia
+    for size, values in results['end_to_end'].items():
+        metrics[f"e2e_{size}.slides_per_s"] = values['slides_per_s']
+        metrics[f"e2e_{size}.peak_rss_mb"] = values['peak_rss_mb']
+    return metrics
+
+
+def compare(metrics, baseline, max_slowdown, max_rss_growth):
+    """Zwraca listę opisów regresji względem wzorca."""
+    regressions = []
+    for name, value in metrics.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        if name.endswith('.slides_per_s'):
+            change = reference / value - 1 if value else float('inf') # spadek przepustowości = spowolnienie
+            limit = max_slowdown
+        elif name.endswith('.peak_rss_mb'):
+            change = value / reference - 1
+            limit = max_rss_growth
+        else:
+            change = value / reference - 1
+            limit = max_slowdown
+        if change > limit:
+            regressions.append(f"{name}: {reference:.2f} → {value:.2f} ({change:+.0%}, próg {limit:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generowania slajdów na syntetycznych raportach.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help="Liczby tematów w raportach (domyślnie 10 100 1000).")
+    parser.add_argument('--repeats', type=int, default=5, help="Liczba powtórzeń pomiarów pojedynczych funkcji.")
+    parser.add_argument('--workers', type=int, default=1, help="Wartość --workers przekazywana do main3.py.")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Plik wzorca do porównania.")
+    parser.add_argument('--save-baseline', action='store_true', help="Zapisz bieżące wyniki jako nowy wzorzec.")
+    parser.add_argument('--max-slowdown', type=float, default=0.15, help="Dopuszczalne spowolnienie względem wzorca (domyślnie 0.15).")
+    parser.add_argument('--max-rss-growth', type=float, default=0.10, help="Dopuszczalny wzrost szczytowego RSS (domyślnie 0.10).")
+    parser.add_argument('--json', metavar='PLIK', help="Zapisz pełne wyniki do pliku JSON.")
+    args = parser.parse_args()
+
+    results = {'micro': {}, 'end_to_end': {}}
+    with tempfile.TemporaryDirectory(prefix='poke_info_bench_') as tmp:
+        fixtures = os.path.join(tmp, 'fixtures')
+        os.makedirs(fixtures)
+        make_fixture_images(fixtures)
+        server, base_url = serve_directory(fixtures)
+        try:
+            micro_dir = os.path.join(tmp, 'micro')
+            os.makedirs(micro_dir)
+            make_report(os.path.join(micro_dir, 'report.csv'), 5, base_url)
+            # Cache i magazyn grafik kart w katalogu tymczasowym, aby syntetyczne grafiki nie trafiły do prawdziwego magazynu
+            main3.CACHE_DIR = os.path.join(micro_dir, '.cache', 'images')
+            main3.CARD_STORE_DIR = os.path.join(micro_dir, '.cache', 'cards')
+            print("⏱️  Pomiary pojedynczych funkcji...")
+            results['micro'] = run_micro(os.path.join(micro_dir, 'report.csv'), args.repeats)
+            for name, values in results['micro'].items():
+                print(f"   {name:<28}{values['median_ms']:>9.1f} ms (średnio {values['mean_ms']:.1f}, min {values['min_ms']:.1f} ms)")
+
+            for size in args.sizes:
+                run_dir = os.path.join(tmp, f"e2e_{size}")
+                os.makedirs(run_dir)
+                report_path = os.path.join(run_dir, 'report.csv')
+                make_report(report_path, size, base_url, seed=size)
+                print(f"🚀 Pełne generowanie: {size} tematów...")
+                values = run_end_to_end(report_path, args.workers)
+                results['end_to_end'][str(size)] = values
+                print(f"   {values['slides']} slajdów w {values['seconds']:.1f} s, "
+                      f"{values['slides_per_s']:.2f} slajdów/s, szczytowe RSS {values['peak_rss_mb']:.0f} MB")
+        finally:
+            server.shutdown()
+
+    metrics = flatten(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'metrics': metrics}, f, indent=1)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update(metrics)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"💾 Zapisano wzorzec: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️  Brak wzorca {args.baseline}; uruchom z --save-baseline, aby go utworzyć.")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(metrics, baseline, args.max_slowdown, args.max_rss_growth)
+    for regression in regressions:
+        print(f"🔥 Regresja: {regression}")
+    if not regressions:
+        print("✅ Brak regresji względem wzorca.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Eksport zbiorczy: karuzele tematów (animowany WebP/GIF, PDF) i arkusze podglądu slajdów kart.
+
+Eksporter dostaje miniaturę każdego slajdu prosto z renderowania (pełnowymiarowa plansza
+nie jest przechowywana) i od razu wkleja ją na właściwą stronę arkusza. Strona arkusza i
+karuzela tematu są zapisywane i zwalniane, gdy tylko dotrą wszystkie ich slajdy, więc w
+pamięci są jednocześnie tylko niedokończone strony i miniatury rozpoczętych tematów.
+"""
+import os
+
+from PIL import Image
+
+import profiling
+
+CAROUSEL_FORMATS = {'webp': '.webp', 'gif': '.gif', 'pdf': '.pdf'}
+
+
+def make_thumbnail(slide, size):
+    """Zmniejsza slajd do miniatury RGB o dłuższym boku `size` (dla 1080 i 540 wystarcza szybkie reduce)."""
+    slide = slide.convert('RGB')
+    longest = max(slide.size)
+    if longest <= size:
+        return slide
+    if longest % size == 0:
+        return slide.reduce(longest // size)
+    scale = size / longest
+    return slide.resize((round(slide.width * scale), round(slide.height * scale)), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def load_thumbnail(path, size):
+    """Wczytuje zapisany slajd od razu w zmniejszonej postaci (draft dla JPEG, reduce dla pozostałych)."""
+    with Image.open(path) as image:
+        image.draft('RGB', (size, size))
+        return make_thumbnail(image, size)
+
+
+class _SheetPage:
+    __slots__ = ('image', 'remaining')
+
+    def __init__(self, image, remaining):
+        self.image = image
+        self.remaining = remaining
+
+
+class SlideExporter:
+    """Składa miniatury slajdów w karuzele tematów i arkusze podglądu slajdów kart.
+
+    `jobs` to pełny plan (także slajdy pominięte przy budowaniu przyrostowym), dzięki czemu
+    z góry znana jest liczba slajdów każdego tematu i układ stron arkusza.
+    """
+
+    def __init__(self, jobs, output_dir, carousel_formats=(), contact_sheet=False, thumbnail_size=540,
+                 tile_size=216, grid=(6, 6), frame_duration=2500, background='#1E1E1E'):
+        self.output_dir = output_dir
+        self.carousel_formats = tuple(carousel_formats)
+        self.thumbnail_size = thumbnail_size
+        self.tile_size = tile_size
+        self.grid = grid
+        self.frame_duration = frame_duration
+        self.background = background
+        self.written = []
+
+        self._topic_slides = {} # indeks tematu -> liczba slajdów
+        self._topic_dirs = {}
+        for job in jobs:
+            self._topic_slides[job['topic_index']] = job['total_slides']
+            self._topic_dirs[job['topic_index']] = os.path.dirname(job['path'])
+        self._frames = {} # indeks tematu -> {numer slajdu: miniatura}
+
+        # Pozycja każdego slajdu karty na arkuszach jest ustalana z góry (niezależnie od kolejności renderowania)
+        self._tiles = {}
+        if contact_sheet:
+            card_jobs = [job for job in jobs if job['kind'] == 'card']
+            for position, job in enumerate(card_jobs):
+                self._tiles[job['path']] = position
+            per_page = grid[0] * grid[1]
+            self._page_sizes = [min(per_page, len(card_jobs) - start) for start in range(0, len(card_jobs), per_page)]
+        self._pages = {} # numer strony -> _SheetPage
+
+    @property
+    def enabled(self):
+        return bool(self.carousel_formats or self._tiles)
+
+    def add(self, job, thumbnail):
+        """Przyjmuje miniaturę slajdu (z make_thumbnail lub load_thumbnail)."""
+        with profiling.stage('export'):
+            if job['path'] in self._tiles:
+                self._add_tile(self._tiles.pop(job['path']), thumbnail)
+            if self.carousel_formats:
+                self._frames.setdefault(job['topic_index'], {})[job['slide_num']] = thumbnail
+                self._write_carousels_if_complete(job['topic_index'])
+
+    def skip(self, job):
+        """Pomija slajd, którego nie udało się wyrenderować ani wczytać; karuzela i arkusz powstaną bez niego."""
+        with profiling.stage('export'):
+            if job['path'] in self._tiles:
+                self._add_tile(self._tiles.pop(job['path']), None)
+            if self.carousel_formats:
+                self._topic_slides[job['topic_index']] -= 1
+                self._write_carousels_if_complete(job['topic_index'])
+
+    def _add_tile(self, position, thumbnail):
+        columns, rows = self.grid
+        page_number, index = divmod(position, columns * rows)
+        page = self._pages.get(page_number)
+        if page is None:
+            count = self._page_sizes[page_number]
+            size = (columns * self.tile_size, -(-count // columns) * self.tile_size)
+            page = self._pages[page_number] = _SheetPage(Image.new('RGB', size, self.background), count)
+
+        if thumbnail is not None:
+            tile = thumbnail.copy()
+            tile.thumbnail((self.tile_size - 8, self.tile_size - 8), Image.Resampling.LANCZOS)
+            row, column = divmod(index, columns)
+            x = column * self.tile_size + (self.tile_size - tile.width) // 2
+            y = row * self.tile_size + (self.tile_size - tile.height) // 2
+            page.image.paste(tile, (x, y))
+
+        page.remaining -= 1
+        if page.remaining == 0:
+            self._save_page(page_number)
+
+    def _save_page(self, page_number):
+        page = self._pages.pop(page_number)
+        path = os.path.join(self.output_dir, f"arkusz_{page_number + 1:02d}.png")
+        os.makedirs(self.output_dir, exist_ok=True)
+        page.image.save(path)
+        self.written.append(path)
+
+    def _write_carousels_if_complete(self, topic_index):
+        frames = self._frames.get(topic_index, {})
+        if len(frames) >= self._topic_slides[topic_index]:
+            self._write_carousels(topic_index, self._frames.pop(topic_index, {}))
+
+    def _write_carousels(self, topic_index, frames):
+        frames = [frames[number] for number in sorted(frames)]
+        if not frames:
+            return
+        topic_dir = self._topic_dirs[topic_index]
+        os.makedirs(topic_dir, exist_ok=True)
+        first, rest = frames[0], frames[1:]
+        for name in self.carousel_formats:
+            path = os.path.join(topic_dir, f"karuzela{CAROUSEL_FORMATS[name]}")
+            if name == 'pdf':
+                first.save(path, save_all=True, append_images=rest, resolution=72)
+            elif name == 'gif':
+                first.save(path, save_all=True, append_images=rest, duration=self.frame_duration, loop=0)
+            else:
+                first.save(path, save_all=True, append_images=rest, duration=self.frame_duration, loop=0, quality=85, method=4)
+            self.written.append(path)
+
+    def close(self):
+        """Zapisuje niedokończone strony i karuzele (np. po przerwaniu). Zwraca listę zapisanych plików."""
+        with profiling.stage('export'):
+            for page_number in sorted(self._pages):
+                self._save_page(page_number)
+            for topic_index in list(self._frames):
+                self._write_carousels(topic_index, self._frames.pop(topic_index))
+        return self.written
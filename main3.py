@@ -1,26 +1,95 @@
-import pandas as pd
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageOps, ImageColor
+from PIL import Image, ImageDraw, ImageFilter, ImageOps, ImageColor
 import requests
+import argparse
+import csv
+import traceback
 from io import BytesIO
 import os
 import re
-import textwrap
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg') # Użyj backendu nieinteraktywnego
+import hashlib
+import json
+import time
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import prices
+import export
+import profiling
+import slidewriter
+import textlayout
+from prices import parse_price
+from slidewriter import _write_atomic
+from textlayout import get_font, fit_text, measure
 
 # --- KONFIGURACJA ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _resolve_asset(*candidates):
+    """Zwraca pierwszy istniejący plik z listy, szukając w katalogu roboczym, a potem w katalogu skryptu."""
+    for name in candidates:
+        for base in ('', BASE_DIR):
+            path = os.path.join(base, name)
+            if os.path.exists(path):
+                return path
+    return candidates[0]
+
 CSV_FILE = 'pokemon_tcg_report_09_19.csv'
-LOGO_PTCG_FILE = 'PTCG.png'
-LOGO_SHOP_FILE = 'banner22.png'
+LOGO_PTCG_FILE = _resolve_asset('PTCG.png')
+LOGO_SHOP_FILE = _resolve_asset('banner22.png')
 OUTPUT_DIR = 'output'
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, '.manifest.json') # Odciski slajdów do przyrostowego budowania
+
+# Zapis slajdów
+OUTPUT_FORMAT = 'png' # 'png', 'webp' (bezstratny), 'webp-lossy' lub 'jpeg'
+PNG_COMPRESS_LEVEL = 6 # 0–9: niższy poziom to szybszy zapis kosztem większych plików
+OUTPUT_QUALITY = 90 # Jakość JPEG i stratnego WebP (0–100)
+OUTPUT_COLORS = None # np. 256: kwantyzacja do palety przed zapisem PNG/WebP
+WRITER_QUEUE_SIZE = 4 # Maksymalna liczba slajdów czekających na zapis w tle
+CAROUSEL_SIZE = 540 # Rozmiar klatek karuzel i źródło kafelków arkuszy podglądu (miniatury slajdów)
+OUTPUT_OPTIONS = slidewriter.OutputOptions(OUTPUT_FORMAT, PNG_COMPRESS_LEVEL, OUTPUT_QUALITY, OUTPUT_COLORS)
 
-# Ścieżki do czcionek
-FONT_BOLD_PATH = os.path.join('fonts', 'Poppins-Bold.ttf')
-FONT_REGULAR_PATH = os.path.join('fonts', 'Poppins-Regular.ttf')
+# Cache obrazów (pamięć + dysk)
+CACHE_DIR = os.path.join('.cache', 'images')
+CACHE_MAX_BYTES = 512 * 1024 * 1024 # Limit rozmiaru cache na dysku
+CACHE_EVICT_TARGET = CACHE_MAX_BYTES * 9 // 10 # Rozmiar, do którego eksmisja zmniejsza cache
+CACHE_MAX_AGE = 24 * 60 * 60 # Po tym czasie (s) wpis jest rewalidowany przez ETag/Last-Modified
+MEMORY_CACHE_MAX_BYTES = 128 * 1024 * 1024 # Budżet pamięci (na proces) dla zdekodowanych obrazów
+BACKGROUND_CACHE_SIZE = 4 # Liczba gotowych teł 1080x1080 trzymanych w pamięci
+BLUR_PROXY_CACHE_SIZE = 256 # Liczba rozmytych miniatur teł (ok. 0,2 MB każda)
+CARD_STORE_DIR = os.path.join('.cache', 'cards') # Przetworzone grafiki kart (miniatura i rozmyte tło), wspólne dla raportów
+CARD_ART_CACHE_SIZE = 16 # Liczba przetworzonych grafik kart trzymanych w pamięci (ok. 1,8 MB każda)
+CARD_HASH_DISTANCE = 10 # Maksymalna odległość Hamminga (na 256 bitów dHash), przy której grafiki uznaje się za tę samą
+CARD_HASH_MIN_BITS = 16 # Skróty z mniejszą liczbą jedynek lub zer (płaskie grafiki) nie są porównywane
+CARD_COLOR_DISTANCE = 20 # Maksymalna średnia różnica (0–255) sygnatur kolorów 4x4; dHash nie rozróżnia kolorów
+OFFLINE_MODE = False # True: obrazy wyłącznie z cache, bez połączeń sieciowych
+
+# Wstępne pobieranie obrazów
+PREFETCH_WORKERS = 16 # Łączna liczba równoległych pobrań
+PREFETCH_PER_HOST = 6 # Maksymalna liczba równoległych pobrań z jednego hosta
+PREFETCH_DEADLINE = 60 # Globalny limit czasu (s) na cały etap pobierania
+
+# Ścieżki do czcionek (Poppins z katalogu fonts/, jeśli jest; inaczej czcionki dołączone do repozytorium)
+FONT_BOLD_PATH = _resolve_asset(os.path.join('fonts', 'Poppins-Bold.ttf'), 'Montserrat-Bold.ttf', 'DejaVuSans.ttf')
+FONT_REGULAR_PATH = _resolve_asset(os.path.join('fonts', 'Poppins-Regular.ttf'), 'Montserrat-Regular.ttf', 'DejaVuSans.ttf')
 
 # Wymiary planszy
 BOARD_WIDTH, BOARD_HEIGHT = 1080, 1080
+CARD_SIZE = (540, 754) # Maksymalny rozmiar karty na slajdzie; obrazy są dekodowane najwyżej do tej wielkości
+BLUR_RADIUS = 20
+BLUR_PROXY_SCALE = 4 # Tło jest rozmywane w rozdzielczości 1/4 i powiększane (przy promieniu 20 różnica dla zdjęć to ok. 0,1/255)
+# Ramka, w której zawijany i dopasowywany jest tekst slajdów
+TEXT_MAX_WIDTH = BOARD_WIDTH - 2 * 80
+TEXT_MAX_HEIGHT = BOARD_HEIGHT - 2 * 120
+
+# Wykres cen
+CHART_ENGINE = 'pillow' # 'pillow' (natywny renderer) lub 'matplotlib' (wolniejszy, ładowany leniwie)
+CHART_SIZE = (320, 168) # Rozmiar wykresu (odpowiada dawnemu wyjściu matplotlib)
+CHART_SUPERSAMPLE = 4 # Krotność nadpróbkowania przy antyaliasingu
 
 # Palety kolorów
 PALETTES = {
@@ -29,31 +98,478 @@ PALETTES = {
     'default': {'frame': '#E76F51', 'title_bg': '#264653', 'title_text': '#FFFFFF', 'chart': '#F4A261'}
 }
 
-# --- FUNKCJE POMOCNICZE ---
+# --- WCZYTYWANIE RAPORTU ---
+
+REPORT_COLUMNS = ('tytul', 'kategoria', 'opis', 'lista kart', 'grafiki', 'ceny', 'tlo', 'źródło')
+COLUMN_ALIASES = {'tło': 'tlo', 'zrodlo': 'źródło'}
+DEFAULT_PRICE = '0 PLN → 0 PLN (0%)'
+
+_LINES_RE = re.compile(r'\n') # lista kart: jedna karta w wierszu
+_URLS_RE = re.compile(r'[|\n]') # grafiki: nowa linia lub |
+_PRICES_RE = re.compile(r'[;\n]') # ceny: nowa linia lub ;
+_NUMBERING_RE = re.compile(r'^\d+\.\s*') # "1. Nazwa karty" -> "Nazwa karty"
+
+class Card:
+    """Karta w temacie: nazwa, adres grafiki i opis ceny."""
+    __slots__ = ('name', 'image_url', 'price')
+
+    def __init__(self, name, image_url, price):
+        self.name = name
+        self.image_url = image_url
+        self.price = price
+
+    @property
+    def clean_name(self):
+        return _NUMBERING_RE.sub('', self.name)
+
+class Topic:
+    """Jeden wiersz raportu: temat serii slajdów."""
+    __slots__ = ('index', 'title', 'category', 'description', 'cards', 'background_url', 'source')
+
+    def __init__(self, index, title, category, description, cards, background_url, source):
+        self.index = index
+        self.title = title
+        self.category = category
+        self.description = description
+        self.cards = cards
+        self.background_url = background_url
+        self.source = source
+
+def _text(value):
+    """Zamienia wartość pola (również pustą lub listę z JSONL) na przycięty tekst."""
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return '\n'.join(str(item) for item in value)
+    return str(value).strip()
+
+def _split(pattern, value):
+    return [part.strip() for part in pattern.split(value) if part.strip()]
+
+def normalize_record(record):
+    """Ujednolica nazwy kolumn rekordu (aliasy, spacje) i zamienia wartości na tekst."""
+    return {COLUMN_ALIASES.get(key.strip(), key.strip()): _text(value) for key, value in record.items() if key}
+
+def parse_topic(index, record):
+    """Tworzy Topic z rekordu raportu. Zgłasza ValueError z listą wszystkich problemów wiersza."""
+    record = normalize_record(record)
+    problems = []
+
+    title = record.get('tytul', '')
+    if not title:
+        problems.append("brak tytułu")
+
+    card_names = _split(_LINES_RE, record.get('lista kart', ''))
+    card_images = _split(_URLS_RE, record.get('grafiki', ''))
+    card_prices = _split(_PRICES_RE, record.get('ceny', ''))
+    if not card_names:
+        problems.append("pusta lista kart")
+    for url in card_images:
+        if not url.startswith('http'):
+            problems.append(f"niepoprawny adres grafiki: '{url[:60]}'")
+
+    background_url = record.get('tlo', '')
+    if background_url and not background_url.startswith('http'):
+        problems.append(f"niepoprawny adres tła: '{background_url[:60]}'")
+
+    if problems:
+        raise ValueError("; ".join(problems))
+
+    if not (len(card_names) == len(card_images) == len(card_prices)):
+        print(f"⚠️  Ostrzeżenie: Niezgodna liczba kart ({len(card_names)}), grafik ({len(card_images)}) i cen ({len(card_prices)}) w wierszu {index}. Kontynuuję z dostępnymi danymi, używając pustych lub domyślnych wartości dla brakujących.")
+        # Uzupełnij listy do najdłuższej wartościami domyślnymi
+        max_len = max(len(card_names), len(card_images), len(card_prices))
+        card_names.extend(['Brak nazwy'] * (max_len - len(card_names)))
+        card_images.extend([''] * (max_len - len(card_images)))
+        card_prices.extend([DEFAULT_PRICE] * (max_len - len(card_prices)))
+
+    cards = tuple(Card(name, url, price) for name, url, price in zip(card_names, card_images, card_prices))
+    return Topic(index, title, record.get('kategoria', ''), record.get('opis', ''), cards, background_url, record.get('źródło', ''))
+
+def _read_records(path):
+    """Strumieniowo zwraca rekordy raportu CSV lub JSONL (nieczytelna linia JSONL jest zwracana jako wyjątek)."""
+    if path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield e
+                    continue
+                yield record if isinstance(record, dict) else ValueError("linia nie jest obiektem JSON")
+        return
+
+    with open(path, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        columns = {COLUMN_ALIASES.get(name.strip(), name.strip()) for name in reader.fieldnames or ()}
+        missing = [column for column in REPORT_COLUMNS if column not in columns]
+        if missing:
+            raise ValueError(f"brakuje kolumn {missing}, dostępne: {reader.fieldnames}")
+        yield from reader
+
+def iter_topics(path, errors):
+    """Strumieniowo wczytuje raport i zwraca kolejne poprawne tematy.
+
+    Błędy wierszy nie przerywają wczytywania: trafiają do listy `errors` jako (numer wiersza, opis),
+    dzięki czemu wszystkie niepoprawne wiersze są zgłaszane w jednym przebiegu.
+    """
+    for index, record in enumerate(_read_records(path), start=1):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            yield parse_topic(index, record)
+        except ValueError as e:
+            errors.append((index, str(e)))
+
+# --- CACHE OBRAZÓW ---
 
-def parse_price_data(price_string):
-    """Przetwarza ciąg cenowy, aby wyodrębnić wartości PLN i procent."""
+_memory_cache = OrderedDict() # url -> zdekodowany obraz RGBA (LRU)
+_memory_cache_bytes = 0 # Łączny rozmiar obrazów w _memory_cache
+_failed_urls = set() # Adresy, których nie udało się pobrać w bieżącym uruchomieniu
+_cache_lock = threading.Lock()
+_disk_cache_bytes = None # Rozmiar cache na dysku (None: jeszcze nie policzony w tym procesie)
+_disk_cache_lock = threading.Lock()
+
+def _create_session():
+    """Tworzy współdzieloną sesję HTTP z pulą połączeń keep-alive i ponawianiem prób."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=PREFETCH_WORKERS, pool_maxsize=PREFETCH_WORKERS, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+_session = _create_session()
+
+def _cache_paths(url):
+    """Zwraca ścieżki pliku z danymi i pliku z metadanymi dla danego URL."""
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.bin"), os.path.join(CACHE_DIR, f"{key}.json")
+
+def _read_cache_meta(meta_path):
     try:
-        # Adjusted regex to handle various delimiters and optional currency symbols
-        pln_match = re.search(r"≈? ([\d,.]+) [€$PLN]+(?: → ([\d,.]+) [€$PLN]+)?", price_string)
-        
-        start_pln = float(pln_match.group(1).replace(',', '').replace('€', '').replace('$', '')) if pln_match and pln_match.group(1) else 0
-        end_pln = float(pln_match.group(2).replace(',', '').replace('€', '').replace('$', '')) if pln_match and pln_match.group(2) else start_pln # If only one price, end_pln is same as start_pln
-        
-        percentage_match = re.search(r"→ ([+-][\d.]+)%", price_string)
-        percentage = f"{percentage_match.group(1)}%" if percentage_match else "0%"
-        
-        return start_pln, end_pln, percentage
-    except (AttributeError, ValueError) as e:
-        print(f"Błąd parsowania ceny: '{price_string}'. Błąd: {e}")
-        return 0, 0, "N/A"
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_cache_meta(meta_path, meta):
+    _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+def _read_cached_bytes(data_path):
+    os.utime(data_path) # Znacznik ostatniego użycia dla eksmisji LRU
+    with open(data_path, 'rb') as f:
+        return f.read()
+
+def _write_cache_entry(url, content, headers):
+    """Zapisuje pobrany obraz i jego nagłówki walidacyjne na dysku."""
+    global _disk_cache_bytes
+    data_path, meta_path = _cache_paths(url)
+    try:
+        previous_size = os.path.getsize(data_path)
+    except OSError:
+        previous_size = 0
+    _write_atomic(data_path, content)
+    _write_cache_meta(meta_path, {
+        'url': url,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'size': len(content),
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'checked': time.time(),
+    })
+
+    # Rozmiar cache jest liczony przyrostowo; katalog jest przeglądany tylko przy pierwszym
+    # zapisie w procesie i po przekroczeniu limitu
+    with _disk_cache_lock:
+        if _disk_cache_bytes is not None:
+            _disk_cache_bytes += len(content) - previous_size
+        if _disk_cache_bytes is None or _disk_cache_bytes > CACHE_MAX_BYTES:
+            _evict_disk_cache()
+
+def _evict_disk_cache():
+    """Liczy rozmiar cache na dysku i po przekroczeniu CACHE_MAX_BYTES usuwa najdawniej używane wpisy.
+
+    Eksmisja zwalnia miejsce z zapasem (do CACHE_EVICT_TARGET), aby kolejne zapisy
+    nie przeglądały katalogu od nowa. Wywoływana pod _disk_cache_lock.
+    """
+    global _disk_cache_bytes
+    entries = []
+    total = 0
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith('.bin'):
+            continue
+        data_path = os.path.join(CACHE_DIR, name)
+        try:
+            stat = os.stat(data_path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, data_path))
+        total += stat.st_size
+
+    if total > CACHE_MAX_BYTES:
+        entries.sort()
+        for _, size, data_path in entries:
+            if total <= CACHE_EVICT_TARGET:
+                break
+            for path in (data_path, data_path[:-len('.bin')] + '.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+    _disk_cache_bytes = total
+
+def _fetch_image_bytes(url):
+    """Zwraca bajty obrazu z cache na dysku lub z sieci (z rewalidacją ETag/Last-Modified)."""
+    data_path, meta_path = _cache_paths(url)
+    meta = _read_cache_meta(meta_path) if os.path.exists(data_path) else None
+
+    if meta is not None and (OFFLINE_MODE or time.time() - meta.get('checked', 0) < CACHE_MAX_AGE):
+        profiling.count('disk_cache_hits')
+        return _read_cached_bytes(data_path)
+    if OFFLINE_MODE:
+        raise requests.exceptions.ConnectionError("tryb offline, brak obrazu w cache")
+
+    headers = {}
+    if meta is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        with profiling.stage('download'):
+            response = _session.get(url, headers=headers, timeout=15)
+        if response.status_code == 304 and meta is not None:
+            profiling.count('revalidated_304')
+            meta['checked'] = time.time()
+            _write_cache_meta(meta_path, meta)
+            return _read_cached_bytes(data_path)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        if meta is None:
+            raise
+        print(f"Nie udało się zweryfikować obrazu z {url}, używam wersji z cache. Błąd: {e}")
+        return _read_cached_bytes(data_path)
+
+    profiling.count('bytes_downloaded', len(response.content))
+    _write_cache_entry(url, response.content, response.headers)
+    return response.content
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+# Tryby, w których reduce() uśrednia wartości pikseli (w trybach z paletą uśredniałby indeksy kolorów)
+_REDUCE_MODES = ('RGB', 'RGBA', 'L', 'LA', 'CMYK', 'YCbCr')
+
+def _decode_image(content, max_size=CARD_SIZE, min_side=BOARD_HEIGHT // BLUR_PROXY_SCALE):
+    """Dekoduje obraz do RGBA, zmniejszając go już przy dekodowaniu, ale nie poniżej miniatury w `max_size`.
+
+    Ten sam obraz może posłużyć za tło, więc krótszy bok nie spada poniżej `min_side`
+    (rozmiaru rozmywanej miniatury tła); inaczej szerokie obrazy byłyby potem powiększane.
+    JPEG jest dekodowany od razu w mniejszej skali (draft), pozostałe formaty są zmniejszane
+    o całkowitą krotność (reduce) przed konwersją do RGBA. Obrazy w innych trybach (paleta,
+    1-bitowe, 16-bitowe) są najpierw konwertowane do RGBA.
+    """
+    image = Image.open(BytesIO(content))
+    scale = min(max_size[0] / image.width, max_size[1] / image.height, 1)
+    scale = max(scale, min(min_side / min(image.width, image.height), 1))
+    target = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    if image.format == 'JPEG':
+        image.draft('RGB', target)
+    factor = min(image.width // target[0], image.height // target[1])
+    if factor >= 2:
+        if image.mode not in _REDUCE_MODES:
+            image = image.convert("RGBA")
+        image = image.reduce(factor)
+    return image.convert("RGBA")
+
+def _load_image(url):
+    """Zwraca współdzielony (niekopiowany) obraz RGBA dla URL lub None, gdy pobranie się nie powiodło."""
+    global _memory_cache_bytes
+    with _cache_lock:
+        cached = _memory_cache.get(url)
+        if cached is not None:
+            _memory_cache.move_to_end(url)
+            profiling.count('memory_cache_hits')
+            return cached
+        if url in _failed_urls:
+            return None
+
+    profiling.count('memory_cache_misses')
+    try:
+        content = _fetch_image_bytes(url)
+        with profiling.stage('decode'):
+            image = _decode_image(content)
+    except (requests.exceptions.RequestException, OSError, ValueError) as e:
+        # Nieczytelny lub uszkodzony obraz jest traktowany jak niepobrany (zastępczy obraz lub gradient)
+        print(f"Nie udało się pobrać lub odczytać obrazu z {url}. Błąd: {e}")
+        with _cache_lock:
+            _failed_urls.add(url)
+        return None
+
+    with _cache_lock:
+        if url not in _memory_cache:
+            _memory_cache[url] = image
+            _memory_cache_bytes += _image_bytes(image)
+        # Najdawniej używane obrazy są usuwane, gdy cache przekracza budżet (ostatni obraz zostaje zawsze)
+        while _memory_cache_bytes > MEMORY_CACHE_MAX_BYTES and len(_memory_cache) > 1:
+            _, evicted = _memory_cache.popitem(last=False)
+            _memory_cache_bytes -= _image_bytes(evicted)
+            profiling.count('memory_cache_evictions')
+    return image
+
+def forget_failed_images():
+    """Pozwala ponownie pobrać obrazy, których wcześniej nie udało się pobrać (np. w kolejnym zleceniu usługi)."""
+    with _cache_lock:
+        _failed_urls.clear()
+
+def image_unavailable(url):
+    """Sprawdza, czy obrazu z URL nie udało się pobrać w tym procesie."""
+    return url in _failed_urls
+
+def collect_image_urls(topics):
+    """Zbiera bez powtórzeń adresy grafik kart i teł, pomijając karty obecne już w magazynie grafik."""
+    urls = {}
+    for topic in topics:
+        card_urls = [card.image_url for card in topic.cards if not _card_in_store(card.name, card.image_url)]
+        for url in card_urls + [topic.background_url]:
+            if url.startswith('http'):
+                urls[url] = None
+    return list(urls)
+
+def prefetch_images(urls, deadline=PREFETCH_DEADLINE):
+    """Pobiera równolegle wszystkie obrazy do cache, zanim zacznie się renderowanie.
+
+    Obrazy są dekodowane z wyprzedzeniem tylko dopóki mieszczą się w MEMORY_CACHE_MAX_BYTES;
+    pozostałe trafiają do cache na dysku, więc renderowanie i tak nie sięga do sieci.
+    Liczba jednoczesnych połączeń do jednego hosta jest ograniczona przez PREFETCH_PER_HOST.
+    Obrazy niepobrane przed upływem `deadline` zostaną pobrane na żądanie podczas renderowania.
+    Zwraca liczbę obrazów, które udało się pobrać.
+    """
+    if not urls:
+        return 0
+
+    host_limits = {urlparse(url).netloc: None for url in urls}
+    for host in host_limits:
+        host_limits[host] = threading.Semaphore(PREFETCH_PER_HOST)
 
+    def fetch(url):
+        with host_limits[urlparse(url).netloc]:
+            if _memory_cache_bytes < MEMORY_CACHE_MAX_BYTES:
+                return _load_image(url) is not None
+            try:
+                _fetch_image_bytes(url)
+                return True
+            except (requests.exceptions.RequestException, OSError) as e:
+                print(f"Nie udało się pobrać obrazu z {url}. Błąd: {e}")
+                with _cache_lock:
+                    _failed_urls.add(url)
+                return False
+
+    executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+    futures = [executor.submit(fetch, url) for url in urls]
+    done, not_done = wait(futures, timeout=deadline)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    if not_done:
+        print(f"⚠️  Przekroczono limit czasu pobierania ({deadline} s). Pozostałe obrazy ({len(not_done)}) zostaną pobrane podczas renderowania.")
+    return sum(1 for future in done if future.exception() is None and future.result())
+
+# --- REJESTR CZCIONEK I LOGOTYPÓW ---
+# Zasoby są wczytywane raz na proces. Po wywołaniu preload_assets() w procesie głównym
+# procesy robocze (fork) dziedziczą gotowy rejestr. Czcionki i ich wymiary zapamiętuje moduł textlayout.
+
+@lru_cache(maxsize=None)
+def get_logo(path, max_size):
+    """Zwraca logo RGBA zmniejszone do `max_size` (współdzielone, nie modyfikować)."""
+    logo = Image.open(path).convert("RGBA")
+    logo.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return logo
+
+def preload_assets():
+    """Wczytuje z góry wszystkie czcionki i logotypy używane przez slajdy."""
+    for path, size in ((FONT_BOLD_PATH, 32), (FONT_BOLD_PATH, 95), (FONT_REGULAR_PATH, 50), (FONT_REGULAR_PATH, 30),
+                       (FONT_BOLD_PATH, 42), (FONT_REGULAR_PATH, 38), (FONT_BOLD_PATH, 48), (FONT_REGULAR_PATH, 32)):
+        get_font(path, size)
+    get_logo(LOGO_PTCG_FILE, (200, 200))
+    get_logo(LOGO_SHOP_FILE, (400, 400))
+
+# --- FUNKCJE POMOCNICZE ---
 
 def create_price_chart(start_price, end_price, color):
     """Tworzy obraz wykresu wzrostu ceny."""
     # Handle cases where prices are the same or decrease
     if start_price == 0 or end_price == 0:
-        return Image.new('RGBA', (250, 120), (0,0,0,0)) # Return empty for invalid prices
+        return Image.new('RGBA', CHART_SIZE, (0,0,0,0)) # Return empty for invalid prices
+
+    with profiling.stage('chart'):
+        if CHART_ENGINE == 'matplotlib':
+            return _create_price_chart_matplotlib(start_price, end_price, color)
+        return _create_price_chart_pillow(start_price, end_price, color)
+
+def _create_price_chart_pillow(start_price, end_price, color):
+    """Rysuje wykres bezpośrednio przez ImageDraw (nadpróbkowanie + zmniejszenie zamiast kodowania PNG).
+
+    Geometria odwzorowuje dawny wykres matplotlib: figura 2.5x1.2 cala przy 150 dpi,
+    domyślne marginesy osi, przycięcie `bbox_inches='tight'` z marginesem 0.1 cala.
+    """
+    scale = CHART_SUPERSAMPLE
+    width, height = CHART_SIZE
+    pad = 0.1 * 150 # pad_inches=0.1 przy dpi=150
+    plot_left, plot_right = pad, pad + (0.9 - 0.125) * 2.5 * 150
+    # matplotlib liczy współrzędne od dołu, więc obcięcie wysokości do pełnych pikseli ucina górę
+    plot_bottom = height - pad
+    plot_top = plot_bottom - (0.88 - 0.11) * 1.2 * 150
+
+    line_color = '#E76F51' if end_price < start_price else color # Red for decrease, original for increase/same
+    rgb = ImageColor.getrgb(line_color)[:3]
+
+    # Marginesy (jak w wersji matplotlib)
+    y_min, y_max = min(start_price, end_price), max(start_price, end_price)
+    y_padding = (y_max - y_min) * 0.1 or start_price * 0.1
+    y_min, y_max = y_min - y_padding, y_max + y_padding
+
+    def to_px(x, y):
+        px = plot_left + (x + 0.1) / 1.2 * (plot_right - plot_left) # xlim = (-0.1, 1.1)
+        py = plot_bottom - (y - y_min) / (y_max - y_min) * (plot_bottom - plot_top)
+        return px * scale, py * scale
+
+    (x0, y0), (x1, y1) = to_px(0, start_price), to_px(1, end_price)
+    baseline = min(to_px(0, 0)[1], plot_bottom * scale) # Wypełnienie do zera, przycięte do obszaru osi
+
+    chart = Image.new('RGBA', (width * scale, height * scale), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(chart)
+
+    # Wypełnienie pod linią (alpha=0.2)
+    draw.polygon([(x0, y0), (x1, y1), (x1, baseline), (x0, baseline)], fill=rgb + (51,))
+
+    # Linia o szerokości 5 pt z zaokrąglonymi końcami
+    line_width = 5 * 150 / 72 * scale
+    draw.line([(x0, y0), (x1, y1)], fill=rgb, width=round(line_width))
+    for cx, cy in ((x0, y0), (x1, y1)):
+        r = line_width / 2
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=rgb)
+
+    # Stylowane znaczniki: średnica 10 pt, biała obwódka 2 pt
+    marker_radius = 10 * 150 / 72 / 2 * scale
+    edge_width = 2 * 150 / 72 * scale
+    for cx, cy in ((x0, y0), (x1, y1)):
+        r = marker_radius + edge_width / 2
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=(255, 255, 255))
+        r = marker_radius - edge_width / 2
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=rgb)
+
+    return chart.reduce(scale)
+
+def _create_price_chart_matplotlib(start_price, end_price, color):
+    """Wersja wykresu oparta na matplotlib (fallback, import przy pierwszym użyciu)."""
+    import matplotlib
+    matplotlib.use('Agg') # Użyj backendu nieinteraktywnego
+    import matplotlib.pyplot as plt
 
     fig, ax = plt.subplots(figsize=(2.5, 1.2), dpi=150)
     x = [0, 1]
@@ -98,150 +614,404 @@ def create_price_chart(start_price, end_price, color):
     plt.close(fig)
     return Image.open(buf)
 
-def download_image(url):
-    """Pobiera obraz z URL."""
-    try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        return Image.open(BytesIO(response.content)).convert("RGBA")
-    except requests.exceptions.RequestException as e:
-        print(f"Nie udało się pobrać obrazu z {url}. Błąd: {e}")
-        return Image.new('RGBA', (200, 280), '#DDD')
+@lru_cache(maxsize=16)
+def _gradient(color1, color2, size):
+    """Buduje pionowy gradient jednym wywołaniem: kolumna 1 px rozciągnięta na pełną szerokość."""
+    width, height = size
+    r1, g1, b1 = ImageColor.getrgb(color1)[:3]
+    r2, g2, b2 = ImageColor.getrgb(color2)[:3]
 
-def create_default_background(color1='#264653', color2='#2A9D8F'):
-    """Generuje domyślne tło z gradientem."""
-    new_img = Image.new('RGB', (BOARD_WIDTH, BOARD_HEIGHT))
-    draw = ImageDraw.Draw(new_img)
-    
-    r1, g1, b1 = ImageColor.getrgb(color1)
-    r2, g2, b2 = ImageColor.getrgb(color2)
-    
-    for i in range(BOARD_HEIGHT):
-        r = int(r1 + (r2 - r1) * i / BOARD_HEIGHT)
-        g = int(g1 + (g2 - g1) * i / BOARD_HEIGHT)
-        b = int(b1 + (b2 - b1) * i / BOARD_HEIGHT)
-        draw.line([(0, i), (BOARD_WIDTH, i)], fill=(r, g, b))
-        
-    return new_img.filter(ImageFilter.GaussianBlur(5))
+    column = Image.new('RGB', (1, height))
+    column.putdata([
+        (int(r1 + (r2 - r1) * i / height), int(g1 + (g2 - g1) * i / height), int(b1 + (b2 - b1) * i / height))
+        for i in range(height)
+    ])
+    return column.resize(size, Image.Resampling.NEAREST)
 
-def create_blurred_background(image_url):
-    """Tworzy rozmyte tło z podanego obrazu lub domyślne tło."""
-    if pd.isna(image_url) or not isinstance(image_url, str) or not image_url.startswith('http'):
-        return create_default_background()
+def create_default_background(color1='#264653', color2='#2A9D8F', size=(BOARD_WIDTH, BOARD_HEIGHT)):
+    """Generuje domyślne tło z gradientem (zapamiętywane per kolory i rozmiar)."""
+    return _gradient(color1, color2, size).copy()
 
-    bg_image = download_image(image_url)
-    if bg_image.size == (200, 280) and bg_image.getpixel((0,0)) == (221, 221, 221, 255): # Check for default placeholder image
-        return create_default_background()
-        
+def _blur_proxy(bg_image):
+    """Kadruje obraz do proporcji planszy i rozmywa go w rozdzielczości 1/BLUR_PROXY_SCALE."""
+    proxy_width, proxy_height = BOARD_WIDTH // BLUR_PROXY_SCALE, BOARD_HEIGHT // BLUR_PROXY_SCALE
     img_width, img_height = bg_image.size
-    board_aspect = BOARD_WIDTH / BOARD_HEIGHT
+    board_aspect = proxy_width / proxy_height
     img_aspect = img_width / img_height
 
     if img_aspect > board_aspect:
-        new_height = BOARD_HEIGHT
-        new_width = int(new_height * img_aspect)
+        new_height = proxy_height
+        new_width = round(new_height * img_aspect)
     else:
-        new_width = BOARD_WIDTH
-        new_height = int(new_width / img_aspect)
+        new_width = proxy_width
+        new_height = round(new_width / img_aspect)
 
-    bg_image_resized = bg_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    bg_image_resized = bg_image.resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=2.0)
 
-    left = (new_width - BOARD_WIDTH) / 2
-    top = (new_height - BOARD_HEIGHT) / 2
-    right = (new_width + BOARD_WIDTH) / 2
-    bottom = (new_height + BOARD_HEIGHT) / 2
+    left = (new_width - proxy_width) // 2
+    top = (new_height - proxy_height) // 2
+    bg_image_cropped = bg_image_resized.crop((left, top, left + proxy_width, top + proxy_height))
 
-    bg_image_cropped = bg_image_resized.crop((left, top, right, bottom))
-    
-    return bg_image_cropped.filter(ImageFilter.GaussianBlur(20))
-
-def draw_text_with_shadow(draw, position, text, font, fill, shadow_color=(0,0,0,128)):
-    """Rysuje tekst z cieniem."""
-    x, y = position
-    draw.text((x+2, y+2), text, font=font, fill=shadow_color)
-    draw.text((x, y), text, font=font, fill=fill)
-
-def draw_common_elements(draw, slide_num, total_slides, palette):
-    """Rysuje ramkę i numerację slajdu."""
-    frame_width = 20
-    draw.rectangle([(0, 0), (BOARD_WIDTH, BOARD_HEIGHT)], outline=palette['frame'], width=frame_width)
-    
-    font_page_num = ImageFont.truetype(FONT_BOLD_PATH, 32)
-    page_text = f"{slide_num} / {total_slides}"
-    page_bbox = draw.textbbox((0, 0), page_text, font_page_num)
-    page_width = page_bbox[2] - page_bbox[0]
-    draw_text_with_shadow(draw, (BOARD_WIDTH - page_width - 40, 30), page_text, font_page_num, '#FFFFFF')
+    # Plansza jest nieprzezroczysta; w trybie RGB półprzezroczyste cienie tekstu są mieszane z tłem,
+    # zamiast wycinać w nim przezroczyste miejsca
+    return bg_image_cropped.filter(ImageFilter.GaussianBlur(BLUR_RADIUS / BLUR_PROXY_SCALE)).convert('RGB')
+
+def _upscale_background(proxy):
+    return proxy.resize((BOARD_WIDTH, BOARD_HEIGHT), Image.Resampling.BICUBIC)
+
+class _ImageUnavailable(Exception):
+    """Obraz nie został pobrany; wyjątek, w przeciwieństwie do None, nie jest zapamiętywany przez lru_cache."""
+
+@lru_cache(maxsize=BLUR_PROXY_CACHE_SIZE)
+def _blurred_proxy(image_url):
+    """Zwraca rozmyte tło w rozdzielczości 1/BLUR_PROXY_SCALE planszy; _ImageUnavailable, gdy obraz jest niedostępny."""
+    bg_image = _load_image(image_url)
+    if bg_image is None:
+        raise _ImageUnavailable(image_url)
+    return _blur_proxy(bg_image)
+
+@lru_cache(maxsize=BACKGROUND_CACHE_SIZE)
+def _blurred_background(image_url):
+    """Zwraca rozmyte tło 1080x1080 dla URL (współdzielone, nie modyfikować); _ImageUnavailable, gdy obraz jest niedostępny."""
+    return _upscale_background(_blurred_proxy(image_url))
+
+def create_blurred_background(image_url):
+    """Tworzy rozmyte tło z podanego obrazu lub domyślne tło.
+
+    Rozmyte tło jest zapamiętywane per URL, więc slajdy jednego tematu liczą je tylko raz.
+    """
+    if not isinstance(image_url, str) or not image_url.startswith('http'):
+        return create_default_background()
+
+    with profiling.stage('background'):
+        try:
+            background = _blurred_background(image_url)
+        except _ImageUnavailable:
+            return create_default_background()
+        return background.copy()
+
+# --- MAGAZYN GRAFIK KART ---
+# Ta sama karta często występuje w kilku tematach i raportach pod różnymi adresami (mirrory, CDN).
+# Przetworzona grafika (miniatura CARD_SIZE i rozmyte tło) jest zapisywana w CARD_STORE_DIR pod
+# kluczem z percepcyjnego skrótu obrazu (dHash), a identyfikator karty z nazwy, np.
+# "(Evolving Skies 215/203)", wskazuje na ten klucz. Kolejne wystąpienie karty z rozpoznanym
+# identyfikatorem i tym samym adresem grafiki nie wymaga pobierania obrazu; pod innym adresem
+# obraz jest pobierany, a zgodność skrótu pozwala użyć istniejącej grafiki. Dopasowanie po
+# skrócie wymaga też zgodnej sygnatury kolorów i nie łączy kart o różnych identyfikatorach.
+
+# "(Evolving Skies 215/203)", "(SV10 232)", "(Crown Zenith GG44/GG70)"
+_CARD_ID_RE = re.compile(r'\((?P<set>[^()]*?)\s+(?P<number>[A-Za-z]*\d+[A-Za-z]*)(?:\s*/\s*(?P<total>[A-Za-z]*\d+))?\s*\)')
+
+class CardArt:
+    """Przetworzona grafika karty: miniatura RGBA i rozmyte tło w rozdzielczości proxy (współdzielone)."""
+    __slots__ = ('key', 'thumbnail', 'background')
+
+    def __init__(self, key, thumbnail, background):
+        self.key = key
+        self.thumbnail = thumbnail
+        self.background = background
+
+_card_art_memory = OrderedDict() # klucz -> CardArt (LRU)
+_card_art_by_url = {} # url -> klucz (w bieżącym procesie)
+_card_index = None # (skrót, identyfikator karty, sygnatura kolorów, klucz) grafik w magazynie; wczytywane przy pierwszym użyciu
+_card_store_lock = threading.Lock()
+
+def card_identifier(card_name):
+    """Zwraca znormalizowany identyfikator karty z nazwy (np. 'evolving skies 215/203', 'sv10 232') lub None."""
+    matches = list(_CARD_ID_RE.finditer(card_name or ''))
+    if not matches:
+        return None
+    match = matches[-1] # Identyfikator jest na końcu nazwy; wcześniejsze nawiasy to np. "(Alt Art)"
+    card_set = ' '.join(match.group('set').lower().split())
+    number = match.group('number').upper().lstrip('0') or '0'
+    if not card_set:
+        return None
+    if match.group('total') is None:
+        return f"{card_set} {number}"
+    return f"{card_set} {number}/{match.group('total').upper().lstrip('0') or '0'}"
+
+def perceptual_hash(image, size=16):
+    """Zwraca dHash obrazu (size*size bitów): odporny na zmianę rozmiaru, kompresję i drobne różnice kolorów."""
+    pixels = image.convert('L').resize((size + 1, size), Image.Resampling.BOX).tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for column in range(size):
+            bits = (bits << 1) | (pixels[offset + column] < pixels[offset + column + 1])
+    return bits
+
+def color_signature(image, size=4):
+    """Zwraca średnie kolory RGB w siatce size x size (uzupełnienie dHash, który widzi tylko jasność)."""
+    return image.resize((size, size), Image.Resampling.BOX).convert('RGB').tobytes()
+
+def _color_distance(signature, other):
+    return sum(abs(a - b) for a, b in zip(signature, other)) / len(signature)
+
+def _card_key(image_hash, signature, card_id):
+    """Klucz grafiki: dHash i skrót sygnatury kolorów z identyfikatorem (płaskie grafiki mają ten sam dHash)."""
+    suffix = hashlib.sha256(signature + (card_id or '').encode('utf-8')).hexdigest()[:12]
+    return f"{image_hash:064x}-{suffix}"
+
+def _card_store_paths(key):
+    return os.path.join(CARD_STORE_DIR, f"{key}.card.png"), os.path.join(CARD_STORE_DIR, f"{key}.bg.png")
+
+def _card_id_path(card_id):
+    return os.path.join(CARD_STORE_DIR, 'ids', hashlib.sha256(card_id.encode('utf-8')).hexdigest()[:32])
+
+def _card_meta_path(key):
+    return os.path.join(CARD_STORE_DIR, f"{key}.json")
+
+def _known_cards():
+    """Zwraca opisy grafik zapisanych w magazynie (wczytywane raz na proces)."""
+    global _card_index
+    if _card_index is None:
+        try:
+            names = os.listdir(CARD_STORE_DIR)
+        except OSError:
+            names = []
+        _card_index = []
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(CARD_STORE_DIR, name), encoding='utf-8') as f:
+                    meta = json.load(f)
+                _card_index.append((int(meta['hash'], 16), meta.get('card'), bytes.fromhex(meta['colors']), name[:-len('.json')]))
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+    return _card_index
+
+def _find_similar_card(image_hash, signature, card_id):
+    """Zwraca klucz grafiki z magazynu najbliższej skrótowi `image_hash` lub None.
+
+    Grafika musi mieścić się w CARD_HASH_DISTANCE i CARD_COLOR_DISTANCE, a jeśli obie karty
+    mają identyfikator, musi on być ten sam. Skróty płaskich grafik nie są porównywane.
+    """
+    if not CARD_HASH_MIN_BITS <= image_hash.bit_count() <= 256 - CARD_HASH_MIN_BITS:
+        return None
+    best = None
+    best_distance = CARD_HASH_DISTANCE + 1
+    for known_hash, known_id, known_signature, key in _known_cards():
+        if card_id and known_id and card_id != known_id:
+            continue
+        distance = (known_hash ^ image_hash).bit_count()
+        if distance < best_distance and _color_distance(signature, known_signature) <= CARD_COLOR_DISTANCE:
+            best, best_distance = key, distance
+    return best
+
+def _remember_card_art(art):
+    with _card_store_lock:
+        _card_art_memory[art.key] = art
+        _card_art_memory.move_to_end(art.key)
+        while len(_card_art_memory) > CARD_ART_CACHE_SIZE:
+            _card_art_memory.popitem(last=False)
+    return art
+
+def _load_card_art(key):
+    """Zwraca CardArt z pamięci lub z magazynu na dysku albo None, gdy go nie ma."""
+    with _card_store_lock:
+        art = _card_art_memory.get(key)
+        if art is not None:
+            _card_art_memory.move_to_end(key)
+            return art
+    thumbnail_path, background_path = _card_store_paths(key)
+    try:
+        with Image.open(thumbnail_path) as thumbnail, Image.open(background_path) as background:
+            art = CardArt(key, thumbnail.convert('RGBA'), background.convert('RGB'))
+    except OSError:
+        return None
+    return _remember_card_art(art)
+
+def _save_card_art(art, image_hash, signature, card_id):
+    """Zapisuje przetworzoną grafikę i jej opis w magazynie (atomowo, więc procesy robocze mogą zapisywać równolegle)."""
+    for image, path in zip((art.thumbnail, art.background), _card_store_paths(art.key)):
+        buffer = BytesIO()
+        image.save(buffer, format='PNG', compress_level=1)
+        _write_atomic(path, buffer.getvalue())
+    # Opis zapisywany jest na końcu: grafika bez opisu nie bierze udziału w dopasowaniu po skrócie
+    meta = {'hash': f"{image_hash:064x}", 'card': card_id, 'colors': signature.hex()}
+    _write_atomic(_card_meta_path(art.key), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+def _link_card_id(card_id, key, image_url):
+    entry = {'card': card_id, 'key': key, 'url': image_url}
+    _write_atomic(_card_id_path(card_id), json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+def _lookup_card_id(card_id, image_url):
+    """Zwraca klucz grafiki powiązanej z identyfikatorem karty, jeśli pochodzi z adresu `image_url`."""
+    try:
+        with open(_card_id_path(card_id), encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Inny adres w raporcie (np. poprawiona grafika) wymaga pobrania obrazu i porównania skrótu
+    if entry.get('card') != card_id or entry.get('url') != image_url:
+        return None
+    return entry.get('key')
+
+def _card_in_store(card_name, image_url):
+    """Sprawdza, czy grafika karty o tej nazwie i adresie jest już w magazynie (wtedy nie trzeba jej pobierać)."""
+    card_id = card_identifier(card_name)
+    key = _lookup_card_id(card_id, image_url) if card_id else None
+    return key is not None and os.path.exists(_card_store_paths(key)[0])
+
+def get_card_art(card_name, image_url):
+    """Zwraca przetworzoną grafikę karty (CardArt) z magazynu lub tworzy ją; None, gdy obraz jest niedostępny.
+
+    Kolejność: identyfikator karty z nazwy (powiązany z tym samym adresem), adres w bieżącym
+    procesie, percepcyjny skrót obrazu.
+    """
+    if not isinstance(image_url, str) or not image_url.startswith('http'):
+        return None
+    card_id = card_identifier(card_name)
+    linked = _lookup_card_id(card_id, image_url) if card_id else None
+    key = linked or _card_art_by_url.get(image_url)
+    art = _load_card_art(key) if key else None
+    if art is not None:
+        profiling.count('card_store_hits')
+    else:
+        image = _load_image(image_url)
+        if image is None:
+            return None
+        image_hash, signature = perceptual_hash(image), color_signature(image)
+        similar = _find_similar_card(image_hash, signature, card_id)
+        art = _load_card_art(similar) if similar else None
+        if art is not None:
+            profiling.count('card_store_hash_hits')
+        else:
+            profiling.count('card_store_misses')
+            thumbnail = image.copy()
+            thumbnail.thumbnail(CARD_SIZE, Image.Resampling.LANCZOS)
+            art = _remember_card_art(CardArt(_card_key(image_hash, signature, card_id), thumbnail, _blur_proxy(image)))
+            try:
+                _save_card_art(art, image_hash, signature, card_id)
+                _known_cards().append((image_hash, card_id, signature, art.key))
+            except OSError as e:
+                print(f"⚠️  Nie udało się zapisać grafiki karty w magazynie: {e}")
+
+    _card_art_by_url[image_url] = art.key
+    if card_id and linked != art.key:
+        try:
+            _link_card_id(card_id, art.key, image_url)
+        except OSError:
+            pass
+    return art
+
+# --- WARSTWY STATYCZNE ---
+# Elementy wspólne dla wielu slajdów (ramka, logotypy, numery stron) są renderowane raz
+# jako warstwy RGBA i nakładane na tło; na każdym slajdzie rysowana jest tylko treść.
+
+FRAME_WIDTH = 20
+
+def _final_layout():
+    """Zwraca logotypy slajdu końcowego i ich pozycje: (logo sklepu, pozycja, logo PTCG, pozycja)."""
+    logo_ptcg = get_logo(LOGO_PTCG_FILE, (200, 200))
+    logo_shop = get_logo(LOGO_SHOP_FILE, (400, 400))
+    shop_x = (BOARD_WIDTH - logo_shop.width) // 2
+    shop_y = (BOARD_HEIGHT - logo_shop.height) // 2 - 100
+    ptcg_x = (BOARD_WIDTH - logo_ptcg.width) // 2
+    ptcg_y = shop_y + logo_shop.height + 20
+    return logo_shop, (shop_x, shop_y), logo_ptcg, (ptcg_x, ptcg_y)
+
+@lru_cache(maxsize=None)
+def _chrome_tiles(frame_color, layout):
+    """Renderuje statyczną warstwę dla (koloru ramki, układu) i dzieli ją na niepuste fragmenty.
+
+    Nakładane są tylko fragmenty (pasy ramki, logotypy), a nie cała warstwa 1080x1080.
+    """
+    layer = Image.new('RGBA', (BOARD_WIDTH, BOARD_HEIGHT), (0, 0, 0, 0))
+    ImageDraw.Draw(layer).rectangle([(0, 0), (BOARD_WIDTH, BOARD_HEIGHT)], outline=frame_color, width=FRAME_WIDTH)
+    boxes = [
+        (0, 0, BOARD_WIDTH, FRAME_WIDTH),
+        (0, BOARD_HEIGHT - FRAME_WIDTH, BOARD_WIDTH, BOARD_HEIGHT),
+        (0, FRAME_WIDTH, FRAME_WIDTH, BOARD_HEIGHT - FRAME_WIDTH),
+        (BOARD_WIDTH - FRAME_WIDTH, FRAME_WIDTH, BOARD_WIDTH, BOARD_HEIGHT - FRAME_WIDTH),
+    ]
+    if layout == 'final':
+        logo_shop, shop_pos, logo_ptcg, ptcg_pos = _final_layout()
+        for logo, (x, y) in ((logo_shop, shop_pos), (logo_ptcg, ptcg_pos)):
+            layer.alpha_composite(logo, (x, y))
+            boxes.append((x, y, x + logo.width, y + logo.height))
+    return tuple((layer.crop(box), box[:2]) for box in boxes)
+
+@lru_cache(maxsize=256)
+def _text_sprite(text, font_path, size, fill, shadow_color=(0,0,0,128)):
+    """Renderuje tekst z cieniem do warstwy RGBA, której początek odpowiada pozycji tekstu."""
+    font = get_font(font_path, size)
+    _, _, right, bottom = font.getbbox(text)
+    sprite_size = (right + 2, bottom + 2)
+
+    shadow_mask = Image.new('L', sprite_size, 0)
+    ImageDraw.Draw(shadow_mask).text((2, 2), text, font=font, fill=255)
+    text_mask = Image.new('L', sprite_size, 0)
+    ImageDraw.Draw(text_mask).text((0, 0), text, font=font, fill=255)
+
+    # Jak ImageDraw.text na planszy RGB: krycie cienia wynika z pokrycia glifu, a nie z alfy koloru
+    shadow_rgb = ImageColor.getrgb(shadow_color)[:3] if isinstance(shadow_color, str) else tuple(shadow_color[:3])
+    shadow = Image.new('RGBA', sprite_size, shadow_rgb + (0,))
+    shadow.putalpha(shadow_mask)
+    text_layer = Image.new('RGBA', sprite_size, ImageColor.getrgb(fill)[:3] + (0,))
+    text_layer.putalpha(text_mask)
+    return Image.alpha_composite(shadow, text_layer)
+
+def _composite(board, layer, position=(0, 0)):
+    """Nakłada warstwę RGBA na planszę (RGBA: alpha_composite, RGB: wklejenie z maską alfa)."""
+    if board.mode == 'RGBA':
+        board.alpha_composite(layer, position)
+    else:
+        board.paste(layer, position, layer)
+
+def apply_slide_chrome(board, palette, slide_num, total_slides, layout='content'):
+    """Nakłada zapamiętane elementy statyczne (ramka, logotypy) i numer slajdu."""
+    with profiling.stage('chrome'):
+        for tile, position in _chrome_tiles(palette['frame'], layout):
+            _composite(board, tile, position)
+
+        page_text = f"{slide_num} / {total_slides}"
+        page_width = textlayout.text_width(FONT_BOLD_PATH, 32, page_text)
+        _composite(board, _text_sprite(page_text, FONT_BOLD_PATH, 32, '#FFFFFF'), (BOARD_WIDTH - page_width - 40, 30))
 
 # --- FUNKCJE GENERUJĄCE SLAJDY ---
 
 def generate_title_slide(data, palette, slide_num, total_slides):
-    board = create_blurred_background(data.get('tlo')) # Use .get() for safety
+    board = create_blurred_background(data.background_url)
+    apply_slide_chrome(board, palette, slide_num, total_slides)
     draw = ImageDraw.Draw(board, 'RGBA')
-    draw_common_elements(draw, slide_num, total_slides, palette)
-    
-    font_title = ImageFont.truetype(FONT_BOLD_PATH, 95)
-    title_text = data['tytul']
-    
-    lines = textwrap.wrap(title_text, width=20)
-    
-    # Calculate total text height dynamically
-    text_heights = [draw.textbbox((0,0), line, font=font_title)[3] - draw.textbbox((0,0), line, font=font_title)[1] for line in lines]
-    total_text_height = sum(text_heights) + (len(lines) - 1) * 15 # Add spacing between lines
 
-    y_start = (BOARD_HEIGHT - total_text_height) / 2
-    
-    current_y = y_start
-    for i, line in enumerate(lines):
-        line_bbox = draw.textbbox((0,0), line, font=font_title)
-        line_width = line_bbox[2] - line_bbox[0]
-        x_pos = (BOARD_WIDTH - line_width) / 2
-        draw_text_with_shadow(draw, (x_pos, current_y), line, font_title, '#FFFFFF')
-        current_y += (line_bbox[3] - line_bbox[1]) + 15 # Move to the next line with spacing
-        
+    # Tytuł zawijany według szerokości w pikselach; długie tytuły dostają mniejszą czcionkę
+    title = fit_text(data.title, FONT_BOLD_PATH, 95, 60, TEXT_MAX_WIDTH, max_height=TEXT_MAX_HEIGHT)
+    title.draw(draw, BOARD_WIDTH / 2, (BOARD_HEIGHT - title.height) / 2, '#FFFFFF')
+
     return board
 
 def generate_description_slide(data, palette, slide_num, total_slides):
-    board = create_blurred_background(data.get('tlo'))
+    board = create_blurred_background(data.background_url)
+    apply_slide_chrome(board, palette, slide_num, total_slides)
     draw = ImageDraw.Draw(board, 'RGBA')
-    draw_common_elements(draw, slide_num, total_slides, palette)
-    
-    font_desc = ImageFont.truetype(FONT_REGULAR_PATH, 50)
-    desc_text = data['opis']
-    
-    lines = textwrap.wrap(desc_text, width=35)
-    
-    text_heights = [draw.textbbox((0,0), line, font=font_desc)[3] - draw.textbbox((0,0), line, font=font_desc)[1] for line in lines]
-    total_text_height = sum(text_heights) + (len(lines) - 1) * 15
-    
-    y_start = (BOARD_HEIGHT - total_text_height) / 2
-    
-    current_y = y_start
-    for i, line in enumerate(lines):
-        line_bbox = draw.textbbox((0,0), line, font=font_desc)
-        line_width = line_bbox[2] - line_bbox[0]
-        x_pos = (BOARD_WIDTH - line_width) / 2
-        draw_text_with_shadow(draw, (x_pos, current_y), line, font_desc, '#FFFFFF')
-        current_y += (line_bbox[3] - line_bbox[1]) + 15
-        
+
+    description = fit_text(data.description, FONT_REGULAR_PATH, 50, 32, TEXT_MAX_WIDTH, max_height=TEXT_MAX_HEIGHT)
+    description.draw(draw, BOARD_WIDTH / 2, (BOARD_HEIGHT - description.height) / 2, '#FFFFFF')
+
     return board
-    
+
 def generate_card_slide(card_name, card_image_url, card_price_str, palette, slide_num, total_slides):
-    board = create_blurred_background(card_image_url)
+    # Miniatura karty i rozmyte tło pochodzą z magazynu grafik (wspólnego dla powtórzeń karty)
+    with profiling.stage('card_image'):
+        art = get_card_art(card_name, card_image_url)
+    with profiling.stage('background'):
+        board = _upscale_background(art.background) if art is not None else create_default_background()
+    apply_slide_chrome(board, palette, slide_num, total_slides)
     draw = ImageDraw.Draw(board, 'RGBA')
-    draw_common_elements(draw, slide_num, total_slides, palette)
     
     # Karta
-    card_image = download_image(card_image_url)
-    card_width, card_height = 540, 754
-    # Check if image is valid before resizing
-    if card_image.mode == 'RGBA' and card_image.getpixel((0,0)) != (221, 221, 221, 255):
-        card_image.thumbnail((card_width, card_height), Image.Resampling.LANCZOS)
+    card_width, card_height = CARD_SIZE
+    if art is not None:
+        card_image = art.thumbnail
     else: # Use a placeholder if download failed
         card_image = Image.new('RGBA', (card_width, card_height), '#999999') # Grey placeholder
         draw_temp = ImageDraw.Draw(card_image)
-        font_temp = ImageFont.truetype(FONT_REGULAR_PATH, 30)
+        font_temp = get_font(FONT_REGULAR_PATH, 30)
         temp_text = "Brak obrazu"
-        temp_bbox = draw_temp.textbbox((0,0), temp_text, font=font_temp)
+        temp_bbox = measure(FONT_REGULAR_PATH, 30, temp_text)
         temp_text_width = temp_bbox[2] - temp_bbox[0]
         temp_text_height = temp_bbox[3] - temp_bbox[1]
         draw_temp.text(((card_width - temp_text_width)/2, (card_height - temp_text_height)/2), temp_text, font=font_temp, fill='#FFFFFF')
@@ -251,30 +1021,19 @@ def generate_card_slide(card_name, card_image_url, card_price_str, palette, slid
     card_y = 80
     board.paste(card_image, (card_x, card_y), card_image)
     
-    # Nazwa karty
-    font_card_name = ImageFont.truetype(FONT_BOLD_PATH, 42)
-    clean_name = re.sub(r'^\d+\.\s*', '', card_name)
-    wrapped_name = textwrap.wrap(clean_name, width=25)
+    # Nazwa karty (najwyżej dwie linie, w razie potrzeby mniejszą czcionką)
     name_y_start = card_y + card_image.height + 25
-    
-    for i, line in enumerate(wrapped_name):
-        name_bbox = draw.textbbox((0,0), line, font=font_card_name)
-        draw_text_with_shadow(draw, ((BOARD_WIDTH - (name_bbox[2] - name_bbox[0]))/2, name_y_start + i * 45), line, font_card_name, '#FFFFFF')
+    name = fit_text(_NUMBERING_RE.sub('', card_name), FONT_BOLD_PATH, 42, 30, TEXT_MAX_WIDTH, max_lines=2, spacing=5)
+    name.draw(draw, BOARD_WIDTH / 2, name_y_start, '#FFFFFF')
 
     # Ceny i wykres
-    start_pln, end_pln, percentage = parse_price_data(card_price_str)
+    price = parse_price(card_price_str)
+    start_pln, end_pln, percentage = price.start, price.end, price.pct_text
     
     # Format prices to 2 decimal places and use space as thousands separator
-    price_text = f"{start_pln:,.2f} PLN → {end_pln:,.2f} PLN".replace(',', ' ')
-    percent_text = f"{percentage}"
-    
-    font_price = ImageFont.truetype(FONT_REGULAR_PATH, 38)
-    font_percent = ImageFont.truetype(FONT_BOLD_PATH, 48)
-    
-    price_y_pos = name_y_start + len(wrapped_name) * 45
-    
-    price_bbox = draw.textbbox((0,0), price_text, font_price)
-    draw_text_with_shadow(draw, ((BOARD_WIDTH - (price_bbox[2] - price_bbox[0]))/2, price_y_pos), price_text, font_price, '#FFFFFF')
+    price_text = f"{start_pln:,.2f} {price.currency} → {end_pln:,.2f} {price.currency}".replace(',', ' ')
+    price_y_pos = name_y_start + name.height + 15
+    fit_text(price_text, FONT_REGULAR_PATH, 38, 24, TEXT_MAX_WIDTH, max_lines=1).draw(draw, BOARD_WIDTH / 2, price_y_pos, '#FFFFFF')
 
     # Determine percentage text color
     percent_color = '#4CAF50' # Green for positive
@@ -283,8 +1042,7 @@ def generate_card_slide(card_name, card_image_url, card_price_str, palette, slid
     elif percentage == "0%" or percentage == "N/A":
         percent_color = '#FFFFFF' # White for no change or N/A
     
-    percent_bbox = draw.textbbox((0,0), percent_text, font=font_percent)
-    draw_text_with_shadow(draw, ((BOARD_WIDTH - (percent_bbox[2] - percent_bbox[0]))/2, price_y_pos + 55), percent_text, font_percent, percent_color)
+    fit_text(percentage, FONT_BOLD_PATH, 48, 30, TEXT_MAX_WIDTH, max_lines=1).draw(draw, BOARD_WIDTH / 2, price_y_pos + 55, percent_color)
     
     # Wykres
     chart_image = create_price_chart(start_pln, end_pln, palette['chart'])
@@ -294,168 +1052,364 @@ def generate_card_slide(card_name, card_image_url, card_price_str, palette, slid
     return board
 
 def generate_final_slide(data, palette, slide_num, total_slides):
-    board = create_blurred_background(data.get('tlo'))
+    board = create_blurred_background(data.background_url)
+    # Ramka i logotypy pochodzą z zapamiętanej warstwy statycznej
+    apply_slide_chrome(board, palette, slide_num, total_slides, layout='final')
     draw = ImageDraw.Draw(board, 'RGBA')
-    draw_common_elements(draw, slide_num, total_slides, palette)
-    
-    # Logotypy
-    logo_ptcg = Image.open(LOGO_PTCG_FILE).convert("RGBA")
-    logo_shop = Image.open(LOGO_SHOP_FILE).convert("RGBA")
-    logo_ptcg.thumbnail((200, 200), Image.Resampling.LANCZOS)
-    logo_shop.thumbnail((400, 400), Image.Resampling.LANCZOS)
-
-    shop_x = (BOARD_WIDTH - logo_shop.width) // 2
-    shop_y = (BOARD_HEIGHT - logo_shop.height) // 2 - 100
-    board.paste(logo_shop, (shop_x, shop_y), logo_shop)
-    
-    ptcg_x = (BOARD_WIDTH - logo_ptcg.width) // 2
-    ptcg_y = shop_y + logo_shop.height + 20
-    board.paste(logo_ptcg, (ptcg_x, ptcg_y), logo_ptcg)
+    _, _, logo_ptcg, (_, ptcg_y) = _final_layout()
 
     # Źródło
-    font_source = ImageFont.truetype(FONT_REGULAR_PATH, 32)
-    source_text = f"Źródło: {data.get('źródło', 'Nieznane')}" # Use .get() for safety
-    source_bbox = draw.textbbox((0,0), source_text, font_source)
-    draw_text_with_shadow(draw, ((BOARD_WIDTH - (source_bbox[2]-source_bbox[0]))/2, ptcg_y + logo_ptcg.height + 20), source_text, font_source, '#FFFFFF')
+    source = fit_text(f"Źródło: {data.source or 'Nieznane'}", FONT_REGULAR_PATH, 32, 24, TEXT_MAX_WIDTH, max_lines=2, spacing=8)
+    source.draw(draw, BOARD_WIDTH / 2, ptcg_y + logo_ptcg.height + 20, '#FFFFFF')
     
     return board
 
-# --- GŁÓWNA PĘTLA WYKONAWCZA ---
-if __name__ == "__main__":
-    print("🚀 Rozpoczynam generowanie serii slajdów...")
+# --- PLANOWANIE I RENDEROWANIE ZADAŃ ---
+
+SLIDE_GENERATORS = {
+    'title': generate_title_slide,
+    'description': generate_description_slide,
+    'card': generate_card_slide,
+    'final': generate_final_slide,
+}
+
+def topic_slug(title):
+    """Zwraca tytuł tematu oczyszczony do nazwy katalogu (pusty, gdy nic z niego nie zostaje)."""
+    # Sanitize title for directory name more robustly
+    return re.sub(r'[^\w\s-]', '', title).replace(' ', '_')
+
+def plan_topic_jobs(topic):
+    """Dzieli temat na niezależne zadania, po jednym na slajd.
+
+    Nazwy plików i numeracja są ustalane tutaj, więc nie zależą od kolejności renderowania.
+    """
+    safe_title = topic_slug(topic.title)
+    if not safe_title: # Fallback if title becomes empty after sanitization
+        safe_title = f"untitled_topic_{topic.index}"
+
+    topic_dir = os.path.join(OUTPUT_DIR, f"{topic.index}_{safe_title}")
+
+    total_slides = 2 + len(topic.cards) + 1 # Tytuł, opis, N kart, koniec
+    # Get palette for the current row, default to 'default' if not found
+    palette = PALETTES.get(topic.category, PALETTES['default'])
+
+    def job(kind, label, file_suffix, args):
+        slide_num = len(jobs) + 1
+        jobs.append({
+            'topic_index': topic.index,
+            'topic': topic.title,
+            'kind': kind,
+            'label': label,
+            'slide_num': slide_num,
+            'total_slides': total_slides,
+            'path': os.path.join(topic_dir, f"{slide_num}_{file_suffix}{OUTPUT_OPTIONS.extension}"),
+            'palette': palette,
+            'args': args + (palette, slide_num, total_slides),
+        })
+
+    jobs = []
+    job('title', "Tytułowy", "tytul", (topic,))
+    job('description', "Opis", "opis", (topic,))
+    for card in topic.cards:
+        clean_name = card.clean_name
+        safe_card_name = re.sub(r'[^\w-]', '', clean_name.replace(' ', '_'))
+        job('card', f"Karta - {clean_name[:30]}...", f"karta_{safe_card_name[:20]}", (card.name, card.image_url, card.price))
+    job('final', "Końcowy", "koniec", (topic,))
+    return jobs
 
-    # Create fonts directory if it doesn't exist (assuming fonts are provided)
-    os.makedirs('fonts', exist_ok=True)
-    # Placeholder for font files if they don't exist
-    if not os.path.exists(FONT_BOLD_PATH):
-        print(f"Brak pliku czcionki: {FONT_BOLD_PATH}. Tworzę domyślny...")
-        # A simple way to create a dummy font file if it's missing for testing
-        # In a real scenario, you'd want to ensure actual font files are present
+def render_slide_job(job, writer=None, thumbnail_size=None):
+    """Renderuje i zapisuje jeden slajd. Zwraca (zadanie, opis błędu lub None, miniatura lub None).
+
+    Z `writer` slajd trafia do kolejki zapisu w tle; błędy zapisu zwraca wtedy writer.close().
+    Miniatura (do eksportu karuzel i arkuszy) powstaje tylko, gdy podano `thumbnail_size`.
+    """
+    profiling.set_topic(job['topic_index'])
+    try:
+        with profiling.stage('slide'):
+            slide = SLIDE_GENERATORS[job['kind']](*job['args'])
+        thumbnail = export.make_thumbnail(slide, thumbnail_size) if thumbnail_size else None
+        if writer is not None:
+            writer.submit(slide, job['path'], job, job['topic_index'])
+        else:
+            slidewriter.save_slide(slide, job['path'], OUTPUT_OPTIONS)
+        return job, None, thumbnail
+    except Exception:
+        return job, traceback.format_exc(), None
+    finally:
+        profiling.set_topic(None)
+
+def _init_worker(output_options, offline_mode, profile=False):
+    """Przygotowuje proces roboczy puli.
+
+    Ustawienia zapisu, tryb offline i profilowanie są przekazywane jawnie, bo przy metodzie
+    startu 'spawn' lub 'forkserver' proces roboczy nie dziedziczy zmian dokonanych w __main__.
+    Czyści też pomiary i statystyki zapisu odziedziczone po fork.
+    """
+    global OUTPUT_OPTIONS, OFFLINE_MODE
+    OUTPUT_OPTIONS = output_options
+    OFFLINE_MODE = offline_mode
+    if profile:
+        profiling.enable()
+    profiling.reset()
+    slidewriter.reset()
+
+def _render_slide_job_in_worker(job, thumbnail_size=None):
+    """Wersja render_slide_job dla puli procesów: zwraca także pomiary i statystyki zapisu z procesu roboczego."""
+    return render_slide_job(job, None, thumbnail_size) + (profiling.take(), slidewriter.take())
+
+def run_slide_jobs(jobs, workers=1, exporter=None):
+    """Wykonuje zadania szeregowo lub w puli procesów; błąd jednego zadania nie przerywa pozostałych.
+
+    Miniatury wyrenderowanych slajdów trafiają od razu do `exporter` (karuzele, arkusze podglądu).
+    Zwraca listę (zadanie, opis błędu) dla zadań zakończonych niepowodzeniem.
+    """
+    failures = []
+    thumbnail_size = exporter.thumbnail_size if exporter is not None and exporter.enabled else None
+
+    def report(job, error, thumbnail=None):
+        status = "✅" if error is None else "🔥"
+        print(f"  {status} [{job['topic_index']}] slajd {job['slide_num']}/{job['total_slides']}: {job['label']}")
+        if error is not None:
+            failures.append((job, error))
+        if thumbnail_size:
+            if thumbnail is not None:
+                exporter.add(job, thumbnail)
+            else:
+                exporter.skip(job)
+
+    if workers <= 1:
+        # Kodowanie i zapis poprzedniego slajdu odbywają się w tle podczas renderowania następnego
+        writer = slidewriter.SlideWriter(OUTPUT_OPTIONS, WRITER_QUEUE_SIZE)
         try:
-            ImageFont.truetype("arial.ttf", 10).save(FONT_BOLD_PATH) # This won't work directly
-        except Exception:
-            print("Nie można utworzyć domyślnej czcionki. Upewnij się, że 'arial.ttf' jest dostępne lub Poppins-Bold.ttf istnieje.")
-            # Fallback for systems without 'arial.ttf' or if save fails
-            # For robust solution, consider a more universal default or instruct user to provide fonts
-            pass # Continue and hope the PIL default font will be used or fail gracefully
-    if not os.path.exists(FONT_REGULAR_PATH):
-        print(f"Brak pliku czcionki: {FONT_REGULAR_PATH}. Tworzę domyślny...")
+            for job in jobs:
+                report(*render_slide_job(job, writer, thumbnail_size))
+        finally:
+            failures.extend(writer.close())
+        return failures
+
+    # W puli każdy proces zapisuje swoje slajdy sam; procesy i tak pracują równolegle
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(OUTPUT_OPTIONS, OFFLINE_MODE, profiling.enabled)) as executor:
+        futures = {executor.submit(_render_slide_job_in_worker, job, thumbnail_size): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                job, error, thumbnail, profile_data, write_stats = future.result()
+                profiling.merge(profile_data)
+                slidewriter.merge(write_stats)
+                report(job, error, thumbnail)
+            except Exception: # np. awaria procesu roboczego
+                report(futures[future], traceback.format_exc())
+    return failures
+
+# --- BUDOWANIE PRZYROSTOWE ---
+
+# Pola tematu, od których zależy wygląd danego slajdu (slajdy kart zależą od swoich argumentów)
+SLIDE_INPUT_FIELDS = {
+    'title': ('title', 'background_url'),
+    'description': ('description', 'background_url'),
+    'final': ('source', 'background_url'),
+}
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    except OSError:
+        return 'missing'
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def _static_inputs_digest():
+    """Skrót kodu, czcionek i logotypów: ich zmiana unieważnia wszystkie slajdy."""
+    digest = hashlib.sha256()
+    code_files = (os.path.abspath(__file__),) + tuple(os.path.abspath(module.__file__) for module in (prices, textlayout, slidewriter))
+    for path in code_files + (FONT_BOLD_PATH, FONT_REGULAR_PATH, LOGO_PTCG_FILE, LOGO_SHOP_FILE):
+        digest.update(_hash_file(path).encode('ascii'))
+    return digest.hexdigest()
+
+def image_digest(url):
+    """Zwraca skrót zawartości obrazu z cache ('missing', gdy obraz jest niedostępny)."""
+    if not isinstance(url, str) or not url.startswith('http'):
+        return None
+    if url in _failed_urls:
+        return 'missing'
+    data_path, meta_path = _cache_paths(url)
+    meta = _read_cache_meta(meta_path)
+    if meta is None or not os.path.exists(data_path):
+        return 'missing'
+    return meta.get('sha256') or _hash_file(data_path)
+
+def slide_image_url(job):
+    """Zwraca adres obrazu, od którego zależy slajd (grafika karty albo tło tematu)."""
+    return job['args'][1] if job['kind'] == 'card' else job['args'][0].background_url
+
+def slide_fingerprint(job):
+    """Liczy odcisk wszystkich danych wejściowych slajdu."""
+    if job['kind'] == 'card':
+        name, _, price_str = job['args'][:3]
+        inputs = {'name': name, 'price': price_str}
+    else:
+        topic = job['args'][0]
+        inputs = {field: getattr(topic, field) for field in SLIDE_INPUT_FIELDS[job['kind']]}
+
+    payload = {
+        'kind': job['kind'],
+        'inputs': inputs,
+        'image': image_digest(slide_image_url(job)),
+        'palette': job['palette'],
+        'slide': [job['slide_num'], job['total_slides']],
+        'static': _static_inputs_digest(),
+        'output': OUTPUT_OPTIONS.fingerprint(),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def load_manifest(path=None):
+    try:
+        with open(path or MANIFEST_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest, path=None):
+    _write_atomic(path or MANIFEST_FILE, json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True).encode('utf-8'))
+
+def remove_orphans(old_manifest, current_paths):
+    """Usuwa pliki z poprzedniego budowania, których nie ma w bieżącym planie. Zwraca ich liczbę."""
+    removed = 0
+    for path in old_manifest:
+        if path in current_paths:
+            continue
         try:
-            ImageFont.truetype("arial.ttf", 10).save(FONT_REGULAR_PATH)
-        except Exception:
-            print("Nie można utworzyć domyślnej czcionki. Upewnij się, że 'arial.ttf' jest dostępne lub Poppins-Regular.ttf istnieje.")
-            pass
+            os.remove(path)
+            removed += 1
+        except OSError:
+            continue
+        topic_dir = os.path.dirname(path)
+        if os.path.isdir(topic_dir) and not os.listdir(topic_dir):
+            os.rmdir(topic_dir)
+    return removed
+
+# --- GŁÓWNA PĘTLA WYKONAWCZA ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generuje serie slajdów na podstawie raportu CSV lub JSONL.")
+    parser.add_argument('report', nargs='?', default=CSV_FILE, help=f"Plik raportu .csv lub .jsonl (domyślnie {CSV_FILE}).")
+    parser.add_argument('--offline', action='store_true', help="Używaj wyłącznie obrazów z cache, bez połączeń sieciowych.")
+    parser.add_argument('--workers', type=int, default=1, help="Liczba procesów renderujących slajdy (domyślnie 1).")
+    parser.add_argument('--force', action='store_true', help="Generuj wszystkie slajdy, także te, których dane się nie zmieniły.")
+    parser.add_argument('--format', choices=list(slidewriter.FORMATS), default=OUTPUT_FORMAT, help=f"Format plików slajdów (domyślnie {OUTPUT_FORMAT}).")
+    parser.add_argument('--compress-level', type=int, choices=range(10), default=PNG_COMPRESS_LEVEL, metavar='0-9', help=f"Poziom kompresji PNG (domyślnie {PNG_COMPRESS_LEVEL}).")
+    parser.add_argument('--quality', type=int, default=OUTPUT_QUALITY, help=f"Jakość JPEG i stratnego WebP (domyślnie {OUTPUT_QUALITY}).")
+    parser.add_argument('--colors', type=int, default=OUTPUT_COLORS, metavar='N', help="Zmniejsz paletę do N kolorów przed zapisem PNG/WebP.")
+    parser.add_argument('--carousel', nargs='+', choices=list(export.CAROUSEL_FORMATS), default=[], metavar='FORMAT', help="Zapisz karuzelę każdego tematu: webp, gif i/lub pdf.")
+    parser.add_argument('--contact-sheet', action='store_true', help="Zapisz arkusze podglądu wszystkich slajdów kart.")
+    parser.add_argument('--profile', nargs='?', const='profile.json', metavar='PLIK', help="Wypisz czasy etapów i zapisz je w formacie Chrome Trace (domyślnie profile.json).")
+    parser.add_argument('--cprofile', metavar='PLIK', help="Uruchom całość pod cProfile i zapisz statystyki (tylko proces główny).")
+    args = parser.parse_args()
+    OFFLINE_MODE = args.offline
+    try:
+        OUTPUT_OPTIONS = slidewriter.OutputOptions(args.format, args.compress_level, args.quality, args.colors)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.profile:
+        profiling.enable()
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
 
+    print("🚀 Rozpoczynam generowanie serii slajdów...")
 
-    for f in [CSV_FILE, LOGO_PTCG_FILE, LOGO_SHOP_FILE]:
+    for f in [args.report, LOGO_PTCG_FILE, LOGO_SHOP_FILE]:
         if not os.path.exists(f):
             print(f"❌ Błąd: Brak pliku: {f}. Upewnij się, że pliki loga i CSV są w odpowiednich miejscach.")
             exit()
     
-    # Check font paths separately, as we might attempt to create a dummy one
-    if not os.path.exists(FONT_BOLD_PATH):
-        print(f"❌ Błąd: Plik czcionki {FONT_BOLD_PATH} nie został znaleziony ani utworzony. Slajdy mogą wyglądać niepoprawnie.")
-    if not os.path.exists(FONT_REGULAR_PATH):
-        print(f"❌ Błąd: Plik czcionki {FONT_REGULAR_PATH} nie został znaleziony ani utworzony. Slajdy mogą wyglądać niepoprawnie.")
+    for f in [FONT_BOLD_PATH, FONT_REGULAR_PATH]:
+        if not os.path.exists(f):
+            print(f"❌ Błąd: Brak pliku czcionki: {f}. Umieść czcionki w katalogu 'fonts' lub obok skryptu.")
+            exit()
+    preload_assets()
 
-    # Read CSV with a more robust parser and error handling
+    # Raport jest czytany strumieniowo; wszystkie błędne wiersze są zgłaszane razem
+    row_errors = []
     try:
-        # Use a more flexible separator and skip bad lines if necessary, or specify 'sep' explicitly
-        # If the issue is with commas inside fields, try quoting='minimal' or 'QUOTE_NONE'
-        df = pd.read_csv(CSV_FILE, sep=',', encoding='utf-8')
-    except pd.errors.ParserError as e:
-        print(f"❌ Błąd parsowania CSV: {e}")
-        print("Upewnij się, że plik CSV jest poprawnie sformatowany. Spróbuj otworzyć go w edytorze tekstu i sprawdzić przecinki oraz cudzysłowy.")
-        exit()
-    except Exception as e:
-        print(f"❌ Nieoczekiwany błąd podczas wczytywania CSV: {e}")
+        topics = list(iter_topics(args.report, row_errors))
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"❌ Błąd wczytywania raportu {args.report}: {e}")
+        print("Upewnij się, że plik jest poprawnie sformatowany. Spróbuj otworzyć go w edytorze tekstu i sprawdzić przecinki oraz cudzysłowy.")
         exit()
 
-    # Ensure all expected columns exist
-    required_columns = ['tytul', 'kategoria', 'opis', 'lista kart', 'grafiki', 'ceny', 'tło', 'źródło']
-    if not all(col in df.columns for col in required_columns):
-        print(f"❌ Błąd: Brakuje wymaganych kolumn w pliku CSV. Oczekiwane: {required_columns}")
-        print(f"Dostępne kolumny: {df.columns.tolist()}")
-        exit()
+    for index, error in row_errors:
+        print(f"⚠️  Pomijam wiersz {index}: {error}")
 
+    # Wstępne pobieranie potrzebuje wszystkich adresów, więc tematy są zbierane przed renderowaniem
+    image_urls = collect_image_urls(topics)
+    print(f"🌐 Pobieram {len(image_urls)} obrazów...")
+    prefetch_start = time.time()
+    with profiling.stage('prefetch'):
+        fetched = prefetch_images(image_urls)
+    print(f"   Pobrano {fetched}/{len(image_urls)} obrazów w {time.time() - prefetch_start:.1f} s")
 
-    for topic_index, (_, row) in enumerate(df.iterrows(), start=1):
-        # Sanitize title for directory name more robustly
-        safe_title = re.sub(r'[^\w\s-]', '', row['tytul']).replace(' ', '_')
-        if not safe_title: # Fallback if title becomes empty after sanitization
-            safe_title = f"untitled_topic_{topic_index}"
+    jobs = []
+    for topic in topics:
+        topic_jobs = plan_topic_jobs(topic)
+        print(f"📁 Seria {topic.index}: '{topic.title}' ({len(topic_jobs)} slajdów)")
+        jobs.extend(topic_jobs)
 
-        topic_dir = os.path.join(OUTPUT_DIR, f"{topic_index}_{safe_title}")
-        os.makedirs(topic_dir, exist_ok=True)
-        
-        print(f"\n📁 Tworzę serię dla: '{row['tytul']}'")
+    manifest = load_manifest()
+    for job in jobs:
+        job['fingerprint'] = slide_fingerprint(job)
+    current_paths = {job['path'] for job in jobs}
+    removed = remove_orphans(manifest, current_paths)
+    if removed:
+        print(f"🧹 Usunięto {removed} nieaktualnych plików.")
 
-        # Przygotowanie danych
-        # Ensure that split() on potentially empty strings doesn't create ['']
-        card_names = [name.strip() for name in row['lista kart'].strip().split('\n') if name.strip()]
-        card_images = [img.strip() for img in row['grafiki'].strip().split('|') if img.strip()] # Split by | for images
-        card_prices = [price.strip() for price in row['ceny'].strip().split(';') if price.strip()] # Split by ; for prices
-        
-        # Fill missing image URLs with a placeholder if fewer images than cards
-        while len(card_images) < len(card_names):
-            card_images.append('') # Append empty string for missing images
-
-        # Fill missing price strings with a placeholder if fewer prices than cards
-        while len(card_prices) < len(card_names):
-            card_prices.append('0 PLN → 0 PLN (0%)') # Append default price string
-
-        if not (len(card_names) == len(card_images) == len(card_prices)):
-            print(f"⚠️  Ostrzeżenie: Niezgodna liczba kart ({len(card_names)}), grafik ({len(card_images)}) i cen ({len(card_prices)}) w wierszu {topic_index}. Kontynuuję z dostępnymi danymi, używając pustych lub domyślnych wartości dla brakujących.")
-            # Adjust lists to match the longest one, filling with defaults
-            max_len = max(len(card_names), len(card_images), len(card_prices))
-            card_names.extend(['Brak nazwy'] * (max_len - len(card_names)))
-            card_images.extend([''] * (max_len - len(card_images)))
-            card_prices.extend(['0 PLN → 0 PLN (0%)'] * (max_len - len(card_prices)))
-
-            # Now, ensure all lists are the same length for zipping
-            card_names = card_names[:max_len]
-            card_images = card_images[:max_len]
-            card_prices = card_prices[:max_len]
-
-
-        total_slides = 2 + len(card_names) + 1 # Tytuł, opis, N kart, koniec
-        current_slide_num = 0
-        
-        try:
-            # Get palette for the current row, default to 'default' if not found
-            palette = PALETTES.get(row.get('kategoria', 'default'), PALETTES['default'])
-
-            # 1. Slajd tytułowy
-            current_slide_num += 1
-            print(f"  > Generuję slajd {current_slide_num}/{total_slides}: Tytułowy")
-            slide = generate_title_slide(row, palette, current_slide_num, total_slides)
-            slide.save(os.path.join(topic_dir, f"{current_slide_num}_tytul.png"))
-
-            # 2. Slajd z opisem
-            current_slide_num += 1
-            print(f"  > Generuję slajd {current_slide_num}/{total_slides}: Opis")
-            slide = generate_description_slide(row, palette, current_slide_num, total_slides)
-            slide.save(os.path.join(topic_dir, f"{current_slide_num}_opis.png"))
-
-            # 3. Slajdy kart
-            for i, (name, img_url, price_str) in enumerate(zip(card_names, card_images, card_prices)):
-                current_slide_num += 1
-                clean_name = re.sub(r'^\d+\.\s*', '', name)
-                print(f"  > Generuję slajd {current_slide_num}/{total_slides}: Karta - {clean_name[:30]}...")
-                slide = generate_card_slide(name, img_url, price_str, palette, current_slide_num, total_slides)
-                safe_card_name = re.sub(r'[^\w-]', '', clean_name.replace(' ', '_'))
-                slide.save(os.path.join(topic_dir, f"{current_slide_num}_karta_{safe_card_name[:20]}.png"))
-            
-            # 4. Slajd końcowy
-            current_slide_num += 1
-            print(f"  > Generuję slajd {current_slide_num}/{total_slides}: Końcowy")
-            slide = generate_final_slide(row, palette, current_slide_num, total_slides)
-            slide.save(os.path.join(topic_dir, f"{current_slide_num}_koniec.png"))
-
-        except Exception as e:
-            print(f"🔥 Wystąpił błąd podczas generowania serii dla '{row['tytul']}': {e}")
-            import traceback
-            traceback.print_exc()
+    if args.force:
+        stale_jobs = jobs
+    else:
+        stale_jobs = [job for job in jobs if manifest.get(job['path']) != job['fingerprint'] or not os.path.exists(job['path'])]
+
+    exporter = export.SlideExporter(jobs, OUTPUT_DIR, args.carousel, args.contact_sheet, CAROUSEL_SIZE)
+    if exporter.enabled:
+        # Niezmienione slajdy trafiają do eksportu jako miniatury wczytane z dysku
+        stale_paths = {job['path'] for job in stale_jobs}
+        for job in jobs:
+            if job['path'] in stale_paths:
+                continue
+            try:
+                exporter.add(job, export.load_thumbnail(job['path'], CAROUSEL_SIZE))
+            except OSError:
+                exporter.skip(job)
+
+    print(f"\n🖼️  Generuję {len(stale_jobs)} z {len(jobs)} slajdów (procesy: {args.workers})...")
+    failures = run_slide_jobs(stale_jobs, args.workers, exporter)
+    if exporter.enabled:
+        exported = exporter.close()
+        print(f"\n📚 Zapisano {len(exported)} plików eksportu (karuzele, arkusze podglądu).")
+
+    for job, error in failures:
+        print(f"\n🔥 Wystąpił błąd podczas generowania slajdu {job['slide_num']} serii '{job['topic']}':")
+        print(error)
+
+    failed_paths = {job['path'] for job, _ in failures}
+    save_manifest({job['path']: job['fingerprint'] for job in jobs if job['path'] not in failed_paths})
+
+    if stale_jobs:
+        print("\n💾 Zapis slajdów:")
+        print(slidewriter.summary())
 
+    if args.profile:
+        print("\n⏱️  Profil generowania:")
+        print(profiling.summary())
+        profiling.write_trace(args.profile)
+        print(f"   Zapisano ślad w formacie Chrome Trace: {args.profile}")
+    if args.cprofile:
+        import pstats
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
 
     print(f"\n🎉 Zakończono! Wszystkie serie slajdów zostały zapisane w folderze '{OUTPUT_DIR}'.")
@@ -0,0 +1,164 @@
+"""Parser opisów cen kart z raportu (kolumna `ceny`).
+
+Obsługiwane zapisy, m.in.:
+    437.22 USD → 699.22 USD → +59.9% (≈ 1583.17 PLN → 2531.88 PLN)
+    €1.234,56 -> €1.500,00 (+21,5%)
+    0 PLN → 0 PLN (0%)
+
+Wyrażenia regularne są kompilowane raz przy imporcie, a wyniki dla powtarzających się
+opisów są zapamiętywane (te same karty pojawiają się w wielu tematach).
+"""
+import re
+from functools import lru_cache
+
+# Waluta wyświetlana na slajdach, jeśli występuje w opisie
+PREFERRED_CURRENCY = 'PLN'
+
+_CURRENCY_SYMBOLS = {'zł': 'PLN', '€': 'EUR', '$': 'USD', 'US$': 'USD', '£': 'GBP'}
+_CURRENCY = r'(?:PLN|zł|USD|EUR|GBP|US\$|\$|€|£)'
+# Liczba: grupy tysięcy oddzielone spacją (także twardą) albo ciąg cyfr z kropkami/przecinkami
+_NUMBER = r'\d{1,3}(?:[ \u00a0\u202f]\d{3})+(?:[.,]\d+)?|\d[\d.,]*\d|\d'
+
+_AMOUNT_RE = re.compile(
+    rf'(?P<prefix>{_CURRENCY})\s?(?P<prefix_number>{_NUMBER})'
+    rf'|(?P<number>{_NUMBER})\s?(?P<suffix>{_CURRENCY})(?![A-Za-z])'
+)
+_ARROW_RE = re.compile(r'\s*(?:→|->|=>)\s*')
+_PERCENT_RE = re.compile(r'(?<![\d.,])(?P<pct>[+\-\u2212]?[ \u00a0\u202f]?\d+(?:[.,]\d+)?)\s?%')
+_SPACES_RE = re.compile(r'[ \u00a0\u202f]')
+
+
+class PriceData:
+    """Wynik parsowania opisu ceny.
+
+    `quotes` mapuje walutę na parę (cena początkowa, cena końcowa); `currency`, `start` i `end`
+    dotyczą waluty wyświetlanej na slajdzie. `pct` to zmiana procentowa (None, gdy nieznana),
+    a `confidence` (0–1) mówi, na ile opis był kompletny i spójny.
+    """
+    __slots__ = ('quotes', 'currency', 'start', 'end', 'pct', 'pct_text', 'confidence')
+
+    def __init__(self, quotes, currency, start, end, pct, pct_text, confidence):
+        self.quotes = quotes
+        self.currency = currency
+        self.start = start
+        self.end = end
+        self.pct = pct
+        self.pct_text = pct_text
+        self.confidence = confidence
+
+    @property
+    def currencies(self):
+        return tuple(self.quotes)
+
+    def __repr__(self):
+        return (f"PriceData(currency={self.currency!r}, start={self.start}, end={self.end}, "
+                f"pct={self.pct}, confidence={self.confidence})")
+
+
+def parse_number(text):
+    """Zamienia liczbę w zapisie US (1,234.56) lub europejskim (1.234,56 / 1 234,56) na float."""
+    text = _SPACES_RE.sub('', text)
+    dot, comma = text.rfind('.'), text.rfind(',')
+    if dot != -1 and comma != -1:
+        # Separatorem dziesiętnym jest ten, który występuje jako ostatni
+        thousands, decimal = (',', '.') if dot > comma else ('.', ',')
+        return float(text.replace(thousands, '').replace(decimal, '.'))
+
+    separator = '.' if dot != -1 else ',' if comma != -1 else None
+    if separator is None:
+        return float(text)
+    integer, _, fraction = text.rpartition(separator)
+    # Kilka takich samych separatorów lub dokładnie trzy cyfry po jedynym: separator tysięcy
+    if text.count(separator) > 1 or (len(fraction) == 3 and integer.lstrip('0')):
+        return float(text.replace(separator, ''))
+    return float(integer.replace(separator, '') + '.' + fraction)
+
+
+def _amounts(text):
+    """Zwraca listę (waluta, wartość, początek, koniec) dla kwot znalezionych w tekście."""
+    amounts = []
+    for match in _AMOUNT_RE.finditer(text):
+        symbol = match.group('prefix') or match.group('suffix')
+        number = match.group('prefix_number') or match.group('number')
+        try:
+            value = parse_number(number)
+        except ValueError:
+            continue
+        amounts.append((_CURRENCY_SYMBOLS.get(symbol, symbol), value, match.start(), match.end()))
+    return amounts
+
+
+@lru_cache(maxsize=4096)
+def parse_price(price_string):
+    """Parsuje opis ceny karty i zwraca PriceData."""
+    text = price_string or ''
+    amounts = _amounts(text)
+
+    quotes = {}
+    for (currency, start, _, start_end), (next_currency, end, end_start, _) in zip(amounts, amounts[1:]):
+        if currency == next_currency and currency not in quotes and _ARROW_RE.fullmatch(text[start_end:end_start]):
+            quotes[currency] = (start, end)
+    single = not quotes and bool(amounts)
+    if single:
+        # Tylko pojedyncza kwota: traktuj ją jako cenę bez zmiany
+        currency, value = amounts[0][0], amounts[0][1]
+        quotes[currency] = (value, value)
+
+    if not quotes:
+        return PriceData({}, PREFERRED_CURRENCY, 0.0, 0.0, None, "N/A", 0.0)
+
+    currency = PREFERRED_CURRENCY if PREFERRED_CURRENCY in quotes else next(iter(quotes))
+    start, end = quotes[currency]
+    computed_pct = (end - start) / start * 100 if start else None
+
+    percent_match = _PERCENT_RE.search(text)
+    if percent_match:
+        pct_text = _SPACES_RE.sub('', percent_match.group('pct')).replace('\u2212', '-')
+        pct = float(pct_text.replace(',', '.'))
+        pct_text = f"{pct_text}%"
+    else:
+        pct = computed_pct
+        pct_text = "N/A" if pct is None else "0%" if round(pct, 1) == 0 else f"{pct:+.1f}%"
+
+    if single:
+        confidence = 0.4
+    elif not percent_match:
+        confidence = 0.7
+    elif computed_pct is None or abs(computed_pct - pct) > 1:
+        confidence = 0.8 # Podany procent nie zgadza się z cenami
+    else:
+        confidence = 1.0
+    return PriceData(quotes, currency, start, end, pct, pct_text, confidence)
+
+
+def parse_price_column(value, separators=re.compile(r'[;\n]')):
+    """Parsuje całą kolumnę `ceny` (jeden opis na wiersz) i zwraca listę PriceData."""
+    return [parse_price(part.strip()) for part in separators.split(value) if part.strip()]
+
+
+if __name__ == "__main__":
+    # Pomiar przepustowości na cenach z dołączonego raportu
+    import csv
+    import sys
+    import time
+
+    report = sys.argv[1] if len(sys.argv) > 1 else 'pokemon_tcg_report_09_19.csv'
+    with open(report, encoding='utf-8', newline='') as f:
+        samples = [price for row in csv.DictReader(f) for price in re.split(r'[;\n]', row['ceny']) if price.strip()]
+
+    repeats = max(1, 100_000 // len(samples))
+    # Unikalne warianty, aby zmierzyć samo parsowanie, a nie trafienia w cache
+    variants = [f"{sample} #{i}" for i in range(repeats) for sample in samples]
+
+    start_time = time.perf_counter()
+    for variant in variants:
+        parse_price.__wrapped__(variant)
+    elapsed = time.perf_counter() - start_time
+    print(f"{len(variants)} opisów w {elapsed:.3f} s ({len(variants) / elapsed:,.0f} opisów/s, bez cache)")
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        for sample in samples:
+            parse_price(sample)
+    elapsed = time.perf_counter() - start_time
+    print(f"{repeats * len(samples)} opisów w {elapsed:.3f} s ({repeats * len(samples) / elapsed:,.0f} opisów/s, z cache)")
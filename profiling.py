@@ -0,0 +1,138 @@
+"""Lekkie pomiary czasu etapów generowania slajdów (flaga --profile).
+
+Gdy profilowanie jest wyłączone, `stage()` zwraca współdzielony pusty menedżer kontekstu,
+a `count()` kończy się na jednym sprawdzeniu flagi, więc narzut jest pomijalny.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+enabled = False
+
+_events = [] # (etap, temat, początek, czas trwania, pid, id wątku)
+_counters = defaultdict(int)
+_counters_lock = threading.Lock() # Liczniki są zwiększane także z wątków pobierających obrazy
+_topic = None
+_NULL_STAGE = nullcontext()
+
+
+class _Stage:
+    __slots__ = ('name', 'topic', 'start')
+
+    def __init__(self, name, topic=None):
+        self.name = name
+        self.topic = topic
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        _events.append((self.name, _topic if self.topic is None else self.topic, self.start, duration, os.getpid(), threading.get_ident()))
+        return False
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def set_topic(topic):
+    """Ustawia temat, do którego będą przypisywane kolejne pomiary w tym procesie."""
+    global _topic
+    _topic = topic
+
+
+def stage(name, topic=None):
+    """Zwraca menedżer kontekstu mierzący czas etapu `name`.
+
+    `topic` przypisuje pomiar do konkretnego tematu (np. w wątku zapisującym w tle).
+    """
+    if not enabled:
+        return _NULL_STAGE
+    return _Stage(name, topic)
+
+
+def count(name, value=1):
+    """Zwiększa licznik `name` (np. trafienia cache, pobrane bajty)."""
+    if enabled:
+        with _counters_lock:
+            _counters[name] += value
+
+
+def reset():
+    """Czyści zebrane dane (np. odziedziczone przez proces roboczy po fork)."""
+    _events.clear()
+    _counters.clear()
+
+
+def take():
+    """Zwraca i czyści dane zebrane w tym procesie (do przekazania z procesu roboczego)."""
+    data = (list(_events), dict(_counters))
+    _events.clear()
+    _counters.clear()
+    return data
+
+
+def merge(data):
+    """Dołącza dane zwrócone przez take() w innym procesie."""
+    events, counters = data
+    _events.extend(events)
+    for name, value in counters.items():
+        _counters[name] += value
+
+
+def _aggregate(key):
+    totals = defaultdict(lambda: [0, 0.0, 0.0]) # liczba, suma, maksimum
+    for event in _events:
+        entry = totals[key(event)]
+        entry[0] += 1
+        entry[1] += event[3]
+        entry[2] = max(entry[2], event[3])
+    return totals
+
+
+def summary():
+    """Zwraca tekstową tabelę czasów per etap i per temat oraz liczniki."""
+    lines = [f"{'Etap':<16}{'Wywołań':>10}{'Suma [s]':>12}{'Średnio [ms]':>15}{'Maks. [ms]':>13}"]
+    stages = _aggregate(lambda event: event[0])
+    for name, (calls, total, longest) in sorted(stages.items(), key=lambda item: -item[1][1]):
+        lines.append(f"{name:<16}{calls:>10}{total:>12.3f}{total / calls * 1000:>15.2f}{longest * 1000:>13.2f}")
+
+    per_topic = _aggregate(lambda event: (event[1], event[0]))
+    topics = sorted({topic for topic, _ in per_topic}, key=lambda topic: (topic is None, str(topic)))
+    stage_names = sorted(stages)
+    if topics:
+        lines.append("")
+        lines.append(f"{'Temat':<10}" + "".join(f"{name[:11]:>12}" for name in stage_names))
+        for topic in topics:
+            label = '-' if topic is None else str(topic)
+            cells = "".join(f"{per_topic[(topic, name)][1] if (topic, name) in per_topic else 0:>12.3f}" for name in stage_names)
+            lines.append(f"{label:<10}{cells}")
+
+    if _counters:
+        lines.append("")
+        for name, value in sorted(_counters.items()):
+            lines.append(f"{name:<24}{value:>14,}".replace(',', ' '))
+    return "\n".join(lines)
+
+
+def write_trace(path):
+    """Zapisuje pomiary w formacie Chrome Trace (chrome://tracing, Perfetto) wraz z licznikami."""
+    origin = min((event[2] for event in _events), default=0.0)
+    trace_events = [{
+        'name': name,
+        'cat': 'slides',
+        'ph': 'X',
+        'ts': round((start - origin) * 1e6, 1),
+        'dur': round(duration * 1e6, 1),
+        'pid': pid,
+        'tid': tid,
+        'args': {'topic': topic},
+    } for name, topic, start, duration, pid, tid in _events]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace_events, 'otherData': {'counters': dict(_counters)}}, f)
@@ -0,0 +1,378 @@
+"""Usługa renderująca slajdy: długo działający proces z rozgrzanymi cache.
+
+Czcionki, logotypy, warstwy statyczne, tła i pobrane grafiki zostają w pamięci między
+zleceniami, więc czas obsługi tematu to w praktyce sam koszt renderowania. Zlecenia
+(jeden temat = jeden obiekt JSON z kluczami jak w raporcie JSONL) przyjmowane są przez
+lokalny endpoint HTTP oraz opcjonalnie z katalogu-kolejki.
+
+Przykłady:
+    python service.py serve --port 8700 --workers 2 --watch kolejka/
+    python service.py submit temat.jsonl                  # ścieżki zapisanych slajdów
+    python service.py submit temat.jsonl --bytes --out slajdy/
+    curl --data-binary @temat.json http://127.0.0.1:8700/render
+"""
+import argparse
+import base64
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import main3
+import slidewriter
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8700
+WATCH_INTERVAL = 1.0 # Co ile sekund sprawdzany jest katalog-kolejka
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+# Odciski slajdów zapisanych przez usługę; osobno od manifestu main3.py, więc uruchomienie
+# wsadowe nie usuwa tematów usługi jako nieaktualnych (i nie nadpisuje ich odcisków)
+MANIFEST_FILE = os.path.join(main3.OUTPUT_DIR, '.service_manifest.json')
+_TOPIC_DIR_RE = re.compile(r'^(?P<index>\d+)_(?P<slug>.+)$') # katalog tematu: "<indeks>_<tytuł>"
+
+
+_worker_request = None # Zlecenie, którego slajdy proces roboczy renderował ostatnio
+
+
+def _render_job(job, return_bytes, request_id=None):
+    """Renderuje slajd i zapisuje go albo zwraca zakodowane bajty. Zwraca (opis slajdu, opis błędu)."""
+    global _worker_request
+    if request_id != _worker_request:
+        # Nowe zlecenie: obrazy niedostępne w poprzednich zleceniach są pobierane ponownie
+        main3.forget_failed_images()
+        _worker_request = request_id
+    info = {'slide': job['slide_num'], 'label': job['label'], 'path': job['path']}
+    try:
+        slide = main3.SLIDE_GENERATORS[job['kind']](*job['args'])
+        if return_bytes:
+            info['data'] = base64.b64encode(slidewriter.encode(slide, main3.OUTPUT_OPTIONS)).decode('ascii')
+        else:
+            slidewriter.save_slide(slide, job['path'], main3.OUTPUT_OPTIONS)
+        return info, None
+    except Exception:
+        return info, traceback.format_exc()
+
+
+def existing_topic_indices(output_dir):
+    """Zwraca {tytuł z nazwy katalogu: indeks} dla katalogów tematów w `output_dir` (najniższy indeks tytułu)."""
+    indices = {}
+    try:
+        names = os.listdir(output_dir)
+    except OSError:
+        return indices
+    for name in names:
+        match = _TOPIC_DIR_RE.match(name)
+        if match and os.path.isdir(os.path.join(output_dir, name)):
+            index = int(match.group('index'))
+            indices[match.group('slug')] = min(index, indices.get(match.group('slug'), index))
+    return indices
+
+
+def parse_index(value):
+    """Zwraca indeks tematu podany w zleceniu (dodatnia liczba całkowita) lub None; ValueError dla złej wartości."""
+    if value is None or value == '':
+        return None
+    text = str(value).strip() if isinstance(value, (int, str)) and not isinstance(value, bool) else ''
+    if not (text.isascii() and text.isdigit()) or int(text) < 1:
+        raise ValueError(f"niepoprawny indeks tematu: {value!r} (oczekiwano dodatniej liczby całkowitej)")
+    return int(text)
+
+
+def read_records(text):
+    """Zamienia treść zlecenia (obiekt JSON, lista obiektów lub JSONL) na listę rekordów."""
+    text = text.strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]
+    records = data if isinstance(data, list) else [data]
+    if not records or not all(isinstance(record, dict) for record in records):
+        raise ValueError("oczekiwano obiektu JSON tematu lub listy takich obiektów")
+    return records
+
+
+class RenderService:
+    """Renderuje tematy w procesie z rozgrzanymi cache (lub w puli procesów utworzonej z tego procesu)."""
+
+    def __init__(self, workers=1):
+        main3.preload_assets()
+        self.workers = workers
+        self.rendered_topics = 0
+        # Temat bez podanego indeksu trafia do katalogu tematu o tym samym tytule (także po restarcie),
+        # więc ponowne zlecenie renderuje tylko zmienione slajdy
+        self._topic_indices = existing_topic_indices(main3.OUTPUT_DIR)
+        self._next_index = max(self._topic_indices.values(), default=0) + 1
+        self._state_lock = threading.Lock() # Indeksy tematów i manifest
+        self._requests = itertools.count(1)
+        self._lock = threading.Lock()
+        self._executor = None
+        if workers > 1:
+            # Procesy są tworzone od razu (fork), zanim wystartują wątki serwera HTTP
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=main3._init_worker,
+                                                 initargs=(main3.OUTPUT_OPTIONS, main3.OFFLINE_MODE))
+            self._executor.submit(int).result()
+
+    def _topic_index(self, title, index=None):
+        """Zwraca indeks tematu: podany przez klienta, dotychczasowy dla tego tytułu albo kolejny wolny."""
+        slug = main3.topic_slug(title)
+        with self._state_lock:
+            if index is None:
+                index = self._topic_indices.get(slug)
+            if index is None:
+                index = self._next_index
+            if slug:
+                self._topic_indices.setdefault(slug, index)
+            self._next_index = max(self._next_index, index + 1)
+        return index
+
+    def _known_fingerprints(self, paths):
+        """Zwraca odciski slajdów już zapisanych na dysku (przez usługę lub uruchomienie wsadowe)."""
+        with self._state_lock:
+            manifest = main3.load_manifest()
+            manifest.update(main3.load_manifest(MANIFEST_FILE))
+        return {path: manifest.get(path) for path in paths}
+
+    def _save_fingerprints(self, fingerprints):
+        """Dopisuje odciski zapisanych slajdów do manifestu usługi, wczytując go ponownie przed zapisem."""
+        with self._state_lock:
+            manifest = main3.load_manifest(MANIFEST_FILE)
+            manifest.update(fingerprints)
+            try:
+                main3.save_manifest(manifest, MANIFEST_FILE)
+            except OSError as e:
+                print(f"⚠️  Nie udało się zapisać manifestu: {e}")
+
+    def render_topic(self, record, return_bytes=False):
+        """Renderuje jeden temat i zwraca słownik z listą slajdów i błędów (ValueError dla złego rekordu)."""
+        start = time.perf_counter()
+        request_id = next(self._requests)
+        # Przejściowy błąd pobierania nie może być trwały w długo działającym procesie
+        main3.forget_failed_images()
+        record = dict(record)
+        index = parse_index(record.pop('index', None))
+        record = main3.normalize_record(record)
+        if record.get('tytul'): # Bez tytułu parse_topic zgłosi błąd; indeks nie jest wtedy przydzielany
+            index = self._topic_index(record['tytul'], index)
+        topic = main3.parse_topic(index or 0, record)
+        main3.prefetch_images(main3.collect_image_urls([topic]))
+        jobs = main3.plan_topic_jobs(topic)
+
+        slides, errors, pending = [], [], []
+        known = self._known_fingerprints([job['path'] for job in jobs])
+        for job in jobs:
+            job['fingerprint'] = main3.slide_fingerprint(job)
+            # Niezmieniony slajd, który już jest na dysku, nie jest renderowany ponownie
+            if not return_bytes and known[job['path']] == job['fingerprint'] and os.path.exists(job['path']):
+                slides.append({'slide': job['slide_num'], 'label': job['label'], 'path': job['path'], 'cached': True})
+            else:
+                pending.append(job)
+
+        if self._executor is not None:
+            results = self._executor.map(_render_job, pending, itertools.repeat(return_bytes), itertools.repeat(request_id))
+        else:
+            with self._lock: # Cache obrazów i warstw są współdzielone przez wątki serwera
+                results = [_render_job(job, return_bytes) for job in pending]
+
+        saved = {}
+        for job, (info, error) in zip(pending, results):
+            if error is None:
+                slides.append(info)
+                # Slajd z obrazem zastępczym nie trafia do manifestu, aby następne zlecenie spróbowało ponownie
+                if not return_bytes and not main3.image_unavailable(main3.slide_image_url(job)):
+                    saved[job['path']] = job['fingerprint']
+            else:
+                errors.append({'slide': info['slide'], 'label': info['label'], 'error': error})
+        if saved:
+            self._save_fingerprints(saved)
+        slides.sort(key=lambda slide: slide['slide'])
+        self.rendered_topics += 1
+        return {
+            'topic': topic.index,
+            'title': topic.title,
+            'format': main3.OUTPUT_OPTIONS.format,
+            'slides': slides,
+            'errors': errors,
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+# --- SERWER HTTP ---
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None # Ustawiane w serve()
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            return self._send_json(404, {'error': "nieznany adres; dostępne: GET /health, POST /render"})
+        self._send_json(200, {'status': 'ok', 'workers': self.service.workers, 'rendered_topics': self.service.rendered_topics})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/render':
+            return self._send_json(404, {'error': "nieznany adres; dostępne: GET /health, POST /render"})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = 0
+        if not 0 < length <= MAX_REQUEST_BYTES:
+            return self._send_json(400, {'error': f"treść zlecenia musi mieć od 1 do {MAX_REQUEST_BYTES} bajtów"})
+        return_bytes = parse_qs(url.query).get('bytes', ['0'])[0] not in ('0', 'false', '')
+
+        try:
+            records = read_records(self.rfile.read(length).decode('utf-8'))
+        except (ValueError, UnicodeDecodeError) as e:
+            return self._send_json(400, {'error': f"niepoprawne zlecenie: {e}"})
+        results = []
+        for record in records:
+            try:
+                results.append(self.service.render_topic(record, return_bytes))
+            except ValueError as e:
+                results.append({'error': str(e)})
+        status = 400 if all('error' in result for result in results) else 200
+        self._send_json(status, {'results': results})
+
+    def log_message(self, format, *args):
+        print(f"🌐 {self.address_string()} {format % args}")
+
+
+# --- KATALOG-KOLEJKA ---
+
+def _process_drop_file(service, path, done_dir):
+    """Renderuje tematy z pliku .json/.jsonl i zapisuje wynik obok w `done_dir`."""
+    name = os.path.basename(path)
+    claimed = os.path.join(done_dir, name)
+    os.replace(path, claimed) # Przeniesienie zaznacza plik jako pobrany z kolejki
+    try:
+        with open(claimed, encoding='utf-8') as f:
+            records = read_records(f.read())
+        results = []
+        for record in records:
+            try:
+                results.append(service.render_topic(record))
+            except ValueError as e:
+                results.append({'error': str(e)})
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        results = [{'error': f"niepoprawne zlecenie: {e}"}]
+    with open(claimed + '.result.json', 'w', encoding='utf-8') as f:
+        json.dump({'results': results}, f, ensure_ascii=False, indent=1)
+    print(f"📥 {name}: {sum(len(result.get('slides', ())) for result in results)} slajdów")
+
+
+def watch_directory(service, directory, stop_event):
+    """Obsługuje pliki .json/.jsonl wrzucane do katalogu; wyniki trafiają do podkatalogu done/."""
+    done_dir = os.path.join(directory, 'done')
+    os.makedirs(done_dir, exist_ok=True)
+    while not stop_event.is_set():
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith(('.json', '.jsonl')) and os.path.isfile(path):
+                try:
+                    _process_drop_file(service, path, done_dir)
+                except OSError as e:
+                    print(f"⚠️  Nie udało się obsłużyć pliku {name}: {e}")
+        stop_event.wait(WATCH_INTERVAL)
+
+
+def serve(host, port, workers, watch_dir=None):
+    service = RenderService(workers)
+    _Handler.service = service
+    server = ThreadingHTTPServer((host, port), _Handler)
+    stop_event = threading.Event()
+    if watch_dir:
+        threading.Thread(target=watch_directory, args=(service, watch_dir, stop_event), daemon=True).start()
+        print(f"📂 Obserwuję katalog {watch_dir}")
+    print(f"🚀 Usługa renderująca działa na http://{host}:{port} (procesy: {workers})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+        service.close()
+
+
+# --- KLIENT ---
+
+def submit(path, url, return_bytes=False, out_dir='service_output'):
+    """Wysyła tematy z pliku do usługi i wypisuje wynik; z `return_bytes` zapisuje odebrane slajdy w `out_dir`."""
+    with open(path, 'rb') as f:
+        body = f.read()
+    request = urllib.request.Request(f"{url}/render?bytes={int(return_bytes)}", data=body,
+                                     headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            payload = json.load(response)
+    except urllib.error.HTTPError as e:
+        payload = json.load(e)
+    elapsed = time.perf_counter() - start
+
+    for result in payload.get('results', [payload]):
+        if 'slides' not in result:
+            print(f"❌ {result.get('error')}")
+            continue
+        print(f"📁 [{result['topic']}] {result['title']}: {len(result['slides'])} slajdów w {result['seconds']:.2f} s")
+        for slide in result['slides']:
+            target = slide['path']
+            if 'data' in slide:
+                target = os.path.join(out_dir, os.path.relpath(slide['path'], main3.OUTPUT_DIR))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(base64.b64decode(slide['data']))
+            print(f"   {'♻️ ' if slide.get('cached') else '✅'} {target}")
+        for error in result['errors']:
+            print(f"   🔥 slajd {error['slide']} ({error['label']}):\n{error['error']}")
+    print(f"⏱️  Odpowiedź po {elapsed:.2f} s")
+    return payload
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Usługa renderująca slajdy z rozgrzanymi cache.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="Uruchom usługę.")
+    serve_parser.add_argument('--host', default=DEFAULT_HOST)
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--workers', type=int, default=1, help="Liczba procesów renderujących (domyślnie 1).")
+    serve_parser.add_argument('--watch', metavar='KATALOG', help="Obsługuj także pliki .json/.jsonl wrzucane do katalogu.")
+    serve_parser.add_argument('--offline', action='store_true', help="Używaj wyłącznie obrazów z cache.")
+
+    submit_parser = commands.add_parser('submit', help="Wyślij tematy z pliku .json/.jsonl do działającej usługi.")
+    submit_parser.add_argument('file')
+    submit_parser.add_argument('--url', default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+    submit_parser.add_argument('--bytes', action='store_true', help="Odbierz slajdy w odpowiedzi zamiast zapisywać je po stronie usługi.")
+    submit_parser.add_argument('--out', default='service_output', help="Katalog na odebrane slajdy (z --bytes).")
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        main3.OFFLINE_MODE = args.offline
+        serve(args.host, args.port, args.workers, args.watch)
+    else:
+        try:
+            submit(args.file, args.url, args.bytes, args.out)
+        except (OSError, ValueError) as e:
+            print(f"❌ Nie udało się wysłać zlecenia: {e}")
+            sys.exit(1)
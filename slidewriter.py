@@ -0,0 +1,186 @@
+"""Zapis slajdów: format i parametry kodera, opcjonalna kwantyzacja palety oraz zapis w tle.
+
+SlideWriter koduje i zapisuje slajdy w osobnym wątku z ograniczoną kolejką, więc
+kodowanie i operacje dyskowe nakładają się na renderowanie kolejnego slajdu, a pamięć
+zajmują najwyżej `max_pending` gotowe plansze. Statystyki (liczba plików, bajty, czas
+kodowania i zapisu) są zbierane per format i zwracane przez summary().
+"""
+import os
+import queue
+import threading
+import time
+import traceback
+from collections import defaultdict
+from io import BytesIO
+
+from PIL import Image
+
+import profiling
+
+# format: (rozszerzenie pliku, nazwa formatu Pillow)
+FORMATS = {
+    'png': ('.png', 'PNG'),
+    'webp': ('.webp', 'WEBP'), # bezstratny
+    'webp-lossy': ('.webp', 'WEBP'),
+    'jpeg': ('.jpg', 'JPEG'),
+}
+
+_stats = defaultdict(lambda: [0, 0, 0.0, 0.0]) # format: [pliki, bajty, kodowanie (s), zapis (s)]
+_stats_lock = threading.Lock()
+
+
+class OutputOptions:
+    """Ustawienia kodera slajdów.
+
+    `compress_level` (0–9) dotyczy PNG; `quality` (0–100) to jakość JPEG i stratnego WebP,
+    a dla bezstratnego WebP nakład pracy kompresora. `colors` (2–256) włącza kwantyzację
+    do palety przed zapisem PNG/WebP.
+    """
+    __slots__ = ('format', 'compress_level', 'quality', 'colors')
+
+    def __init__(self, format='png', compress_level=6, quality=90, colors=None):
+        if format not in FORMATS:
+            raise ValueError(f"Nieznany format wyjściowy: {format} (dostępne: {', '.join(FORMATS)})")
+        if colors is not None and not 2 <= colors <= 256:
+            raise ValueError(f"Liczba kolorów palety musi mieścić się w zakresie 2–256, podano {colors}")
+        self.format = format
+        self.compress_level = compress_level
+        self.quality = quality
+        self.colors = colors
+
+    @property
+    def extension(self):
+        return FORMATS[self.format][0]
+
+    def save_params(self):
+        """Zwraca argumenty Image.save() dla wybranego formatu."""
+        pillow_format = FORMATS[self.format][1]
+        if self.format == 'png':
+            return {'format': pillow_format, 'compress_level': self.compress_level}
+        if self.format == 'webp':
+            return {'format': pillow_format, 'lossless': True, 'quality': self.quality, 'method': 4}
+        if self.format == 'webp-lossy':
+            return {'format': pillow_format, 'quality': self.quality, 'method': 4}
+        return {'format': pillow_format, 'quality': self.quality, 'optimize': True}
+
+    def fingerprint(self):
+        """Parametry wpływające na zawartość pliku (do odcisku slajdu w manifeście)."""
+        return [self.format, self.compress_level, self.quality, self.colors]
+
+
+def encode(image, options):
+    """Koduje planszę zgodnie z ustawieniami i zwraca bajty pliku."""
+    if options.format == 'jpeg':
+        image = image.convert('RGB')
+    elif options.colors:
+        # FASTOCTREE obsługuje także obrazy RGBA i jest kilkukrotnie szybsza od MEDIANCUT
+        image = image.quantize(options.colors, method=Image.Quantize.FASTOCTREE)
+    buffer = BytesIO()
+    image.save(buffer, **options.save_params())
+    return buffer.getvalue()
+
+
+def _write_atomic(path, data):
+    """Zapisuje plik przez plik tymczasowy, aby przerwany zapis nie zostawił uszkodzonego pliku.
+
+    Nazwa pliku tymczasowego zawiera identyfikator procesu i wątku, więc równoległe zapisy
+    tej samej ścieżki nie kolidują (wygrywa ostatni os.replace).
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_slide(image, path, options, topic=None):
+    """Koduje i zapisuje slajd w bieżącym wątku, aktualizując statystyki. Zwraca liczbę bajtów."""
+    start = time.perf_counter()
+    with profiling.stage('encode', topic):
+        data = encode(image, options)
+    encoded = time.perf_counter()
+    with profiling.stage('write', topic):
+        _write_atomic(path, data)
+    written = time.perf_counter()
+
+    with _stats_lock:
+        entry = _stats[options.format]
+        entry[0] += 1
+        entry[1] += len(data)
+        entry[2] += encoded - start
+        entry[3] += written - encoded
+    return len(data)
+
+
+class SlideWriter:
+    """Zapisuje slajdy w wątku w tle; submit() blokuje, gdy w kolejce czeka `max_pending` plansz."""
+
+    _STOP = object()
+
+    def __init__(self, options, max_pending=4):
+        self.options = options
+        self.failures = [] # (znacznik, opis błędu)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='slide-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, image, path, tag=None, topic=None):
+        """Dodaje slajd do kolejki zapisu. `tag` identyfikuje slajd w liście błędów."""
+        self._queue.put((image, path, tag, topic))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            image, path, tag, topic = item
+            try:
+                save_slide(image, path, self.options, topic)
+            except Exception:
+                self.failures.append((tag, traceback.format_exc()))
+
+    def close(self):
+        """Czeka na zapisanie wszystkich slajdów i zwraca listę błędów zapisu."""
+        self._queue.put(self._STOP)
+        self._thread.join()
+        return self.failures
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def reset():
+    """Czyści statystyki (np. odziedziczone przez proces roboczy po fork)."""
+    _stats.clear()
+
+
+def take():
+    """Zwraca i czyści statystyki zebrane w tym procesie (do przekazania z procesu roboczego)."""
+    with _stats_lock:
+        data = {name: list(entry) for name, entry in _stats.items()}
+        _stats.clear()
+    return data
+
+
+def merge(data):
+    """Dołącza statystyki zwrócone przez take() w innym procesie."""
+    with _stats_lock:
+        for name, values in data.items():
+            entry = _stats[name]
+            for i, value in enumerate(values):
+                entry[i] += value
+
+
+def summary():
+    """Zwraca tekstową tabelę: liczba plików, rozmiar i czasy kodowania/zapisu per format."""
+    lines = [f"{'Format':<12}{'Plików':>8}{'Razem [MB]':>12}{'Średnio [KB]':>14}{'Kodowanie [ms]':>16}{'Zapis [ms]':>12}"]
+    for name, (files, size, encode_time, write_time) in sorted(_stats.items()):
+        if not files:
+            continue
+        lines.append(f"{name:<12}{files:>8}{size / 1024 ** 2:>12.2f}{size / files / 1024:>14.1f}"
+                     f"{encode_time / files * 1000:>16.1f}{write_time / files * 1000:>12.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,82 @@
+"""Testy magazynu grafik kart: dopasowanie po skrócie nie może łączyć różnych kart."""
+import random
+
+import pytest
+from PIL import Image, ImageFilter
+
+import main3
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Pusty magazyn w katalogu tymczasowym; obrazy są podawane przez słownik adres -> obraz."""
+    images = {}
+    monkeypatch.setattr(main3, 'CARD_STORE_DIR', str(tmp_path / 'cards'))
+    monkeypatch.setattr(main3, '_card_art_memory', main3.OrderedDict())
+    monkeypatch.setattr(main3, '_card_art_by_url', {})
+    monkeypatch.setattr(main3, '_card_index', None)
+    monkeypatch.setattr(main3, '_load_image', lambda url: images.get(url))
+    return images
+
+
+def _pattern(seed=0):
+    """Powtarzalny wzór jasności (rozmyty szum) w rozmiarze grafiki karty."""
+    rng = random.Random(seed)
+    pattern = Image.new('L', (48, 67))
+    pattern.putdata([rng.randrange(256) for _ in range(48 * 67)])
+    return pattern.filter(ImageFilter.GaussianBlur(2)).resize((734, 1024), Image.Resampling.BICUBIC)
+
+
+def _art(color, seed=0):
+    """Grafika o wzorze jasności `seed` w kolorze `color` (ten sam wzór daje prawie ten sam dHash)."""
+    pattern = _pattern(seed)
+    return Image.composite(Image.new('RGB', pattern.size, color), Image.new('RGB', pattern.size, 'black'), pattern).convert('RGBA')
+
+
+def test_recolored_art_with_similar_hash_is_not_shared(store):
+    red, blue = _art('#C83C3C'), _art('#3C6EC8') # podobna jasność, inne kolory
+    assert (main3.perceptual_hash(red) ^ main3.perceptual_hash(blue)).bit_count() <= main3.CARD_HASH_DISTANCE
+    store['http://x/9.png'], store['http://x/21.png'] = red, blue
+
+    first = main3.get_card_art('Card A (Evolving Skies 9/203)', 'http://x/9.png')
+    second = main3.get_card_art('Card B (Evolving Skies 21/203)', 'http://x/21.png')
+    assert first.key != second.key
+    assert second.thumbnail.getpixel((200, 300))[2] > second.thumbnail.getpixel((200, 300))[0]
+
+
+def test_different_card_ids_never_match(store):
+    art = _art('#D03030')
+    store['http://x/a.png'], store['http://mirror/b.png'] = art, art.copy()
+
+    first = main3.get_card_art('Card A (Evolving Skies 9/203)', 'http://x/a.png')
+    second = main3.get_card_art('Card B (Evolving Skies 21/203)', 'http://mirror/b.png')
+    assert first.key != second.key
+
+
+def test_flat_images_are_not_matched(store):
+    red = Image.new('RGBA', (734, 1024), 'red')
+    green = Image.new('RGBA', (734, 1024), 'green')
+    assert main3.perceptual_hash(red) == main3.perceptual_hash(green) == 0
+    store['http://x/red.png'], store['http://x/green.png'] = red, green
+
+    first = main3.get_card_art('Red card', 'http://x/red.png')
+    second = main3.get_card_art('Green card', 'http://x/green.png')
+    assert first.key != second.key
+    assert second.thumbnail.getpixel((10, 10))[:3] == (0, 128, 0)
+    assert first.thumbnail.getpixel((10, 10))[:3] == (255, 0, 0) # Zapis drugiej nie nadpisał pierwszej
+
+
+def test_same_art_under_another_url_is_reused(store):
+    art = _art('#D03030')
+    store['http://x/a.png'] = art
+    store['http://mirror/a.jpg'] = art.resize((600, 837), Image.Resampling.LANCZOS)
+
+    first = main3.get_card_art('Card A (Evolving Skies 9/203)', 'http://x/a.png')
+    second = main3.get_card_art('Card A (Evolving Skies 9/203)', 'http://mirror/a.jpg')
+    assert first.key == second.key
+
+    # Po restarcie procesu dopasowanie korzysta z opisów zapisanych w magazynie
+    main3._card_index = None
+    main3._card_art_by_url.clear()
+    store['http://other/a.png'] = art.copy()
+    assert main3.get_card_art('Card A', 'http://other/a.png').key == first.key
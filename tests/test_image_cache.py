@@ -0,0 +1,104 @@
+"""Testy cache obrazów na dysku: rewalidacja, tryb offline i eksmisja (lokalny serwer HTTP)."""
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import main3
+import profiling
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    requests_seen = 0
+
+    def do_GET(self):
+        type(self).requests_seen += 1
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Serwuje katalog `www` na wolnym porcie; zwraca (katalog, adres bazowy, klasa handlera)."""
+    www = tmp_path / 'www'
+    www.mkdir()
+    handler = type('Handler', (_Handler,), {'requests_seen': 0})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(handler, directory=str(www)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield www, f"http://127.0.0.1:{httpd.server_address[1]}", handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    """Pusty cache w katalogu tymczasowym i włączone liczniki profilowania."""
+    monkeypatch.setattr(main3, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(main3, 'OFFLINE_MODE', False)
+    monkeypatch.setattr(main3, '_disk_cache_bytes', None)
+    monkeypatch.setattr(profiling, 'enabled', True)
+    profiling.reset()
+    yield
+    profiling.reset()
+
+
+def _counter(name):
+    return profiling._counters.get(name, 0)
+
+
+def test_download_is_cached_on_disk(server):
+    www, base_url, handler = server
+    (www / 'a.bin').write_bytes(b'obraz' * 100)
+
+    assert main3._fetch_image_bytes(f"{base_url}/a.bin") == b'obraz' * 100
+    assert main3._fetch_image_bytes(f"{base_url}/a.bin") == b'obraz' * 100
+    assert handler.requests_seen == 1
+    assert _counter('disk_cache_hits') == 1
+    assert main3.image_digest(f"{base_url}/a.bin") not in (None, 'missing')
+
+
+def test_expired_entry_is_revalidated_with_304(server, monkeypatch):
+    www, base_url, handler = server
+    (www / 'a.bin').write_bytes(b'obraz')
+    main3._fetch_image_bytes(f"{base_url}/a.bin")
+
+    monkeypatch.setattr(main3, 'CACHE_MAX_AGE', 0)
+    assert main3._fetch_image_bytes(f"{base_url}/a.bin") == b'obraz'
+    assert handler.requests_seen == 2
+    assert _counter('revalidated_304') == 1
+    assert _counter('bytes_downloaded') == len(b'obraz')
+
+
+def test_offline_mode_serves_hits_and_rejects_misses(server, monkeypatch):
+    www, base_url, handler = server
+    (www / 'a.bin').write_bytes(b'obraz')
+    main3._fetch_image_bytes(f"{base_url}/a.bin")
+
+    monkeypatch.setattr(main3, 'OFFLINE_MODE', True)
+    monkeypatch.setattr(main3, 'CACHE_MAX_AGE', 0) # Offline nie rewaliduje nawet przeterminowanych wpisów
+    assert main3._fetch_image_bytes(f"{base_url}/a.bin") == b'obraz'
+    with pytest.raises(requests.exceptions.ConnectionError):
+        main3._fetch_image_bytes(f"{base_url}/b.bin")
+    assert handler.requests_seen == 1
+
+
+def test_eviction_removes_least_recently_used_down_to_target(monkeypatch):
+    monkeypatch.setattr(main3, 'CACHE_MAX_BYTES', 10_000)
+    monkeypatch.setattr(main3, 'CACHE_EVICT_TARGET', 6_000)
+    urls = [f"http://example.invalid/{i}" for i in range(10)]
+    for i, url in enumerate(urls):
+        main3._write_cache_entry(url, b'x' * 1000, {})
+        data_path, _ = main3._cache_paths(url)
+        os.utime(data_path, (i, i)) # Kolejność ostatniego użycia
+    assert main3._disk_cache_bytes == 10_000 # Dokładnie na limicie: bez eksmisji
+
+    main3._write_cache_entry('http://example.invalid/new', b'x' * 1000, {})
+    remaining = [url for url in urls + ['http://example.invalid/new'] if os.path.exists(main3._cache_paths(url)[0])]
+    assert main3._disk_cache_bytes == 6_000
+    assert remaining == urls[5:] + ['http://example.invalid/new']
+    assert not os.path.exists(main3._cache_paths(urls[0])[1]) # Metadane usuwane razem z danymi
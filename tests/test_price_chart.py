@@ -0,0 +1,39 @@
+"""Porównanie natywnego wykresu cen (ImageDraw) z dawnym wykresem matplotlib."""
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+import main3
+
+pytest.importorskip('matplotlib')
+
+BACKGROUND = (38, 70, 83, 255) # Kolor title_bg palet, jak pod wykresem na slajdzie
+MAX_MEAN_DIFF = 1.5 # Średnia różnica kanału (0–255) po nałożeniu na tło
+
+
+def _on_background(chart):
+    background = Image.new('RGBA', chart.size, BACKGROUND)
+    return Image.alpha_composite(background, chart.convert('RGBA')).convert('RGB')
+
+
+@pytest.mark.parametrize('start, end', [
+    (100, 150), # wzrost
+    (150, 100), # spadek
+    (100, 100), # bez zmiany
+    (1, 5000), # szeroki zakres
+    (1583.17, 2531.88),
+])
+@pytest.mark.parametrize('color', ['#E76F51', '#E9C46A', '#F4A261'])
+def test_pillow_chart_matches_matplotlib(start, end, color):
+    native = main3._create_price_chart_pillow(start, end, color)
+    reference = main3._create_price_chart_matplotlib(start, end, color)
+
+    assert native.size == reference.size == main3.CHART_SIZE
+    difference = ImageChops.difference(_on_background(native), _on_background(reference))
+    mean = sum(ImageStat.Stat(difference).mean) / 3
+    assert mean < MAX_MEAN_DIFF, f"średnia różnica {mean:.2f}"
+
+
+def test_invalid_prices_give_empty_chart():
+    chart = main3.create_price_chart(0, 100, '#F4A261')
+    assert chart.size == main3.CHART_SIZE
+    assert chart.getextrema()[3] == (0, 0)
@@ -0,0 +1,126 @@
+"""Testy parsera cen: zapisy liczb, opisy z raportu i odporność na dowolny tekst."""
+import csv
+import os
+import random
+
+import pytest
+
+import prices
+
+NBSP, NNBSP = '\u00a0', '\u202f' # twarda spacja i wąska twarda spacja
+REPORT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pokemon_tcg_report_09_19.csv')
+
+
+def _group(integer, separator):
+    digits = str(integer)
+    groups = []
+    while digits:
+        digits, group = digits[:-3], digits[-3:]
+        groups.insert(0, group)
+    return separator.join(groups)
+
+
+def _formats(cents):
+    """Zwraca zapisy kwoty: US, europejski, z odstępami (także twardymi) i bez separatorów."""
+    integer, fraction = divmod(cents, 100)
+    return [
+        f"{_group(integer, ',')}.{fraction:02d}",
+        f"{_group(integer, '.')},{fraction:02d}",
+        f"{_group(integer, ' ')},{fraction:02d}",
+        f"{_group(integer, NBSP)}.{fraction:02d}",
+        f"{_group(integer, NNBSP)},{fraction:02d}",
+        f"{integer}.{fraction:02d}",
+    ]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_parse_number_round_trip(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        cents = rng.randrange(10 ** rng.randint(1, 11))
+        for text in _formats(cents):
+            assert prices.parse_number(text) == pytest.approx(cents / 100), text
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1,234', 1234), ('1.234', 1234), ('1 234', 1234), ('1.234.567', 1234567),
+    ('12,5', 12.5), ('0,123', 0.123), ('7', 7), ('1,234,567.89', 1234567.89),
+])
+def test_parse_number_separators(text, expected):
+    assert prices.parse_number(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_parse_price_round_trip(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        start, end = rng.randrange(1, 10 ** 8), rng.randrange(1, 10 ** 8)
+        pct = (end - start) / start * 100
+        style = rng.randrange(3)
+        first, second = _formats(start)[style], _formats(end)[style]
+        pct_text = f"{pct:+.1f}%" if style == 0 else f"{pct:+.1f}%".replace('.', ',')
+        arrow = rng.choice(['→', '->', '=>'])
+        price = prices.parse_price(f"{first} PLN {arrow} {second} PLN ({pct_text})")
+        assert price.currency == 'PLN'
+        assert price.start == pytest.approx(start / 100)
+        assert price.end == pytest.approx(end / 100)
+        assert price.pct == pytest.approx(pct, abs=0.05)
+        assert price.confidence == 1.0
+
+
+def test_report_prices_parse_with_full_confidence():
+    with open(REPORT, encoding='utf-8', newline='') as f:
+        columns = [row['ceny'] for row in csv.DictReader(f)]
+    parsed = [price for column in columns for price in prices.parse_price_column(column)]
+    assert parsed
+    for price in parsed:
+        assert price.confidence == 1.0, price
+        assert price.currency == 'PLN'
+        assert price.start > 0 and price.end > 0
+
+
+def test_report_format_prefers_pln():
+    price = prices.parse_price('437.22 USD → 699.22 USD → +59.9% (≈ 1583.17 PLN → 2531.88 PLN)')
+    assert price.quotes == {'USD': (437.22, 699.22), 'PLN': (1583.17, 2531.88)}
+    assert (price.currency, price.start, price.end, price.pct_text) == ('PLN', 1583.17, 2531.88, '+59.9%')
+
+
+@pytest.mark.parametrize('text, currency, start, end', [
+    ('€1.234,56 -> €1.500,00 (+21,5%)', 'EUR', 1234.56, 1500.0),
+    ('$10 => $12.50', 'USD', 10.0, 12.5),
+    ('1 999 zł → 2 499 zł (+25%)', 'PLN', 1999.0, 2499.0),
+    ('0 PLN → 0 PLN (0%)', 'PLN', 0.0, 0.0),
+])
+def test_parse_price_formats(text, currency, start, end):
+    price = prices.parse_price(text)
+    assert (price.currency, price.start, price.end) == (currency, start, end)
+
+
+def test_unparseable_price():
+    price = prices.parse_price('brak danych')
+    assert (price.start, price.end, price.pct, price.pct_text, price.confidence) == (0.0, 0.0, None, 'N/A', 0.0)
+
+
+def test_sign_separated_from_percent_by_newline():
+    # Znak i liczba w różnych wierszach nie tworzą procentu (wcześniej: ValueError w float())
+    assert prices.parse_price('1 PLN → 2 PLN +\n3%').pct == 3.0
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_text_never_raises(seed):
+    rng = random.Random(seed)
+    alphabet = '0123456789., %+-\u2212→>=()≈€$£złPLNUSDEURGBPabc\n;' + NBSP + NNBSP
+    for _ in range(500):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        price = prices.parse_price(text)
+        assert 0.0 <= price.confidence <= 1.0
+        assert price.pct_text == 'N/A' or price.pct_text.endswith('%')
+
+
+def test_parse_price_column_splits_lines_and_semicolons():
+    column = '1 PLN → 2 PLN (+100%); 3 USD -> 3 USD (0%)\n\n  ;5 EUR → 4 EUR (-20%)\n'
+    parsed = prices.parse_price_column(column)
+    assert [(price.currency, price.start, price.end) for price in parsed] == [
+        ('PLN', 1.0, 2.0), ('USD', 3.0, 3.0), ('EUR', 5.0, 4.0)]
+    assert [price.pct_text for price in parsed] == ['+100%', '0%', '-20%']
+    assert prices.parse_price_column('') == []
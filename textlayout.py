@@ -0,0 +1,129 @@
+"""Układ tekstu na slajdach: zawijanie według szerokości w pikselach i dopasowanie rozmiaru czcionki.
+
+Wymiary tekstu są zapamiętywane per (czcionka, rozmiar, tekst), więc powtarzające się
+słowa, linie i numery slajdów mierzone są tylko raz w procesie. `layout_text()` i `fit_text()`
+zwracają TextLayout, który rysuje wszystkie linie (z cieniem) w jednym przebiegu.
+"""
+from functools import lru_cache
+
+from PIL import ImageFont
+
+import profiling
+
+SHADOW_COLOR = (0, 0, 0, 128)
+SHADOW_OFFSET = (2, 2)
+
+
+@lru_cache(maxsize=None)
+def get_font(path, size):
+    """Zwraca czcionkę TrueType wczytaną raz dla pary (ścieżka, rozmiar)."""
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=8192)
+def measure(font_path, size, text):
+    """Zwraca bbox (lewo, góra, prawo, dół) tekstu narysowanego w punkcie (0, 0)."""
+    return get_font(font_path, size).getbbox(text)
+
+
+def text_width(font_path, size, text):
+    left, _, right, _ = measure(font_path, size, text)
+    return right - left
+
+
+class TextLayout:
+    """Linie tekstu z zapamiętanymi wymiarami, gotowe do narysowania w jednym przebiegu.
+
+    Linie są wyśrodkowane w poziomie i rozmieszczone co stałą wysokość: wysokość
+    nad linią bazową czcionki plus `spacing` albo `line_height`, jeśli została podana.
+    `width` i `height` opisują faktycznie zamalowany obszar (bez cienia).
+    """
+    __slots__ = ('font_path', 'size', 'lines', 'boxes', 'offsets', 'ink_top', 'width', 'height')
+
+    def __init__(self, font_path, size, lines, spacing=15, line_height=None):
+        self.font_path = font_path
+        self.size = size
+        self.lines = tuple(lines)
+        self.boxes = tuple(measure(font_path, size, line) for line in self.lines)
+        if line_height is None:
+            ascent, _ = get_font(font_path, size).getmetrics()
+            line_height = ascent + spacing
+        self.offsets = tuple(i * line_height for i in range(len(self.lines)))
+        if self.boxes:
+            self.ink_top = min(offset + top for offset, (_, top, _, _) in zip(self.offsets, self.boxes))
+            ink_bottom = max(offset + bottom for offset, (_, _, _, bottom) in zip(self.offsets, self.boxes))
+        else:
+            self.ink_top = ink_bottom = 0
+        self.height = ink_bottom - self.ink_top
+        self.width = max((right - left for left, _, right, _ in self.boxes), default=0)
+
+    @property
+    def font(self):
+        return get_font(self.font_path, self.size)
+
+    def draw(self, draw, center_x, top, fill, shadow_color=SHADOW_COLOR):
+        """Rysuje linie wyśrodkowane względem `center_x` tak, aby tekst zaczynał się na wysokości `top`."""
+        font = self.font
+        shadow_x, shadow_y = SHADOW_OFFSET
+        with profiling.stage('text'):
+            for line, (left, _, right, _), offset in zip(self.lines, self.boxes, self.offsets):
+                x, y = center_x - (right - left) / 2 - left, top - self.ink_top + offset
+                if shadow_color is not None:
+                    draw.text((x + shadow_x, y + shadow_y), line, font=font, fill=shadow_color)
+                draw.text((x, y), line, font=font, fill=fill)
+
+
+def wrap_text(text, font_path, size, max_width):
+    """Dzieli tekst na linie nie szersze niż `max_width` pikseli (słowa dłuższe od linii zostają całe)."""
+    lines = []
+    for paragraph in text.splitlines() or ['']:
+        words = paragraph.split()
+        line = ''
+        for word in words:
+            candidate = f"{line} {word}" if line else word
+            if not line or text_width(font_path, size, candidate) <= max_width:
+                line = candidate
+            else:
+                lines.append(line)
+                line = word
+        if line:
+            lines.append(line)
+    return lines
+
+
+def layout_text(text, font_path, size, max_width, spacing=15, line_height=None):
+    """Zawija tekst do szerokości `max_width` i zwraca TextLayout."""
+    return TextLayout(font_path, size, wrap_text(text, font_path, size, max_width), spacing, line_height)
+
+
+def _fits(layout, max_width, max_height, max_lines):
+    return (layout.width <= max_width
+            and (max_height is None or layout.height <= max_height)
+            and (max_lines is None or len(layout.lines) <= max_lines))
+
+
+@lru_cache(maxsize=1024)
+def fit_text(text, font_path, max_size, min_size, max_width, max_height=None, max_lines=None,
+             spacing=15, line_height=None):
+    """Zwraca TextLayout w największym rozmiarze z [min_size, max_size], który mieści się w ramce.
+
+    `line_height` (stała wysokość linii) skaluje się proporcjonalnie do rozmiaru czcionki.
+    Jeśli tekst nie mieści się nawet w `min_size`, zwracany jest układ w rozmiarze minimalnym.
+    """
+    def build(size):
+        height = None if line_height is None else round(line_height * size / max_size)
+        return layout_text(text, font_path, size, max_width, spacing, height)
+
+    best = build(max_size)
+    if _fits(best, max_width, max_height, max_lines):
+        return best
+    low, high = min_size, max_size - 1
+    best = None
+    while low <= high:
+        size = (low + high) // 2
+        layout = build(size)
+        if _fits(layout, max_width, max_height, max_lines):
+            best, low = layout, size + 1
+        else:
+            high = size - 1
+    return best or build(min_size)